@@ -0,0 +1,98 @@
+"""
+Miniaturas de ``Profile.avatar``.
+
+Al subir un avatar la vista encarga ``generate_avatar_thumbnails`` a
+coopconnect.tasks, fuera de la petición. La tarea recorta la imagen al
+cuadrado y guarda junto al original una versión WebP y otra JPEG por cada
+tamaño de ``AVATAR_SIZES`` (``avatars/foto.jpg`` -> ``avatars/foto_96.webp``),
+sin los metadatos EXIF del original (ubicación, cámara...).
+
+``Profile.avatar_thumbnails`` guarda el nombre del avatar cuyas miniaturas
+ya existen; mientras no coincida con el avatar actual las plantillas siguen
+usando el original. ``manage.py generate_avatar_thumbnails`` genera las que
+falten (avatares anteriores o ``BACKGROUND_TASKS=off``).
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+from PIL import Image, ImageOps
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = (48, 96, 256)
+# Formato -> (extensión, opciones de Image.save)
+THUMBNAIL_FORMATS = {
+    'WEBP': ('webp', {'quality': 80, 'method': 6}),
+    'JPEG': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def thumbnail_name(name, size, extension):
+    """Nombre de la miniatura de ``name``: avatars/foto.jpg -> avatars/foto_96.webp"""
+    root, _ = posixpath.splitext(name)
+    return f'{root}_{size}.{extension}'
+
+
+def pick_size(size):
+    """Menor miniatura que cubre ``size`` píxeles (o la mayor si ninguna)"""
+    return next((available for available in AVATAR_SIZES if available >= size), AVATAR_SIZES[-1])
+
+
+def delete_thumbnails(name):
+    for size in AVATAR_SIZES:
+        for extension, _ in THUMBNAIL_FORMATS.values():
+            default_storage.delete(thumbnail_name(name, size, extension))
+
+
+def generate_avatar_thumbnails(profile_pk):
+    """Generar las miniaturas del avatar actual del perfil y borrar las del anterior
+
+    Idempotente: si las miniaturas del avatar actual ya existen no hace nada.
+    """
+    profile = Profile.objects.filter(pk=profile_pk).only('avatar', 'avatar_thumbnails').first()
+    if profile is None:
+        return
+    name = profile.avatar.name or ''
+    if name == profile.avatar_thumbnails:
+        return
+
+    if name:
+        with default_storage.open(name, 'rb') as original:
+            image = Image.open(original)
+            # JPEG: decodificar ya reducido (1/2, 1/4, 1/8) cuando la foto es mucho más grande
+            image.draft('RGB', (AVATAR_SIZES[-1] * 2, AVATAR_SIZES[-1] * 2))
+            # Aplicar la rotación de EXIF antes de descartarlo
+            image = ImageOps.exif_transpose(image).convert('RGB')
+        for size in AVATAR_SIZES:
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            for image_format, (extension, options) in THUMBNAIL_FORMATS.items():
+                buffer = BytesIO()
+                # Sin exif=...: la miniatura se guarda sin metadatos
+                thumbnail.save(buffer, image_format, **options)
+                thumbnail_path = thumbnail_name(name, size, extension)
+                default_storage.delete(thumbnail_path)
+                default_storage.save(thumbnail_path, ContentFile(buffer.getvalue()))
+
+    # Si el usuario subió otro avatar mientras tanto, su propia tarea lo resolverá
+    current = Q(avatar=name) if name else Q(avatar__isnull=True) | Q(avatar='')
+    updated = Profile.objects.filter(current, pk=profile_pk).update(avatar_thumbnails=name)
+    if updated and profile.avatar_thumbnails:
+        delete_thumbnails(profile.avatar_thumbnails)
+    logger.info('Miniaturas del avatar del perfil %s: %s', profile_pk, name or 'sin avatar')
+
+
+def pending_thumbnails():
+    """Perfiles cuyo avatar actual aún no tiene miniaturas"""
+    no_avatar = Q(avatar__isnull=True) | Q(avatar='')
+    return list(
+        Profile.objects
+        .exclude(avatar_thumbnails=F('avatar'))
+        .exclude(no_avatar, avatar_thumbnails='')
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from accounts.avatars import generate_avatar_thumbnails, pending_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas de los avatares que aún no las tienen'
+
+    def handle(self, *args, **options):
+        pending = pending_thumbnails()
+        if not pending:
+            self.stdout.write('No hay avatares pendientes.')
+            return
+
+        for profile_pk in pending:
+            generate_avatar_thumbnails(profile_pk)
+        self.stdout.write(self.style.SUCCESS(f'{len(pending)} avatares procesados.'))
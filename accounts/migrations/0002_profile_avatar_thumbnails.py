@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_thumbnails',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
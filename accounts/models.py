@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models import DEFERRED
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models.signals import post_init, post_save
+from django.dispatch import Signal, receiver
+
+# Un perfil guardado cambió de empresa (unirse o salir). Argumentos: instance, old_company_id.
+# Lo escuchan las membresías de chat (messaging.membership) y las estadísticas por sector.
+profile_company_changed = Signal()
 
 
 class Profile(models.Model):
@@ -9,12 +14,27 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     company = models.ForeignKey('organizations.Company', on_delete=models.SET_NULL, null=True, blank=True, related_name='members')
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    # Avatar cuyas miniaturas ya están generadas (ver accounts.avatars)
+    avatar_thumbnails = models.CharField(max_length=100, blank=True, editable=False)
     bio = models.TextField(max_length=500, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.user.username}"
 
+    def avatar_url(self, size, extension='webp'):
+        """URL de la miniatura del avatar que cubre ``size`` píxeles
+
+        El original mientras las miniaturas no estén listas; '' sin avatar.
+        """
+        from .avatars import pick_size, thumbnail_name
+
+        if not self.avatar:
+            return ''
+        if self.avatar_thumbnails != self.avatar.name:
+            return self.avatar.url
+        return self.avatar.storage.url(thumbnail_name(self.avatar.name, pick_size(size), extension))
+
     class Meta:
         verbose_name = 'Perfil'
         verbose_name_plural = 'Perfiles'
@@ -32,3 +52,19 @@ def save_profile(sender, instance, **kwargs):
     """Guardar perfil cuando se guarda el usuario"""
     instance.profile.save()
 
+
+@receiver(post_init, sender=Profile)
+def remember_company(sender, instance, **kwargs):
+    """Recordar la empresa original para detectar cambios al guardar"""
+    # Sin acceder al atributo: si el campo está diferido no se dispara una consulta
+    instance._original_company_id = instance.__dict__.get('company_id', DEFERRED)
+
+
+@receiver(post_save, sender=Profile)
+def detect_company_change(sender, instance, **kwargs):
+    """Avisar una sola vez a quienes escuchan profile_company_changed"""
+    old_company_id = instance._original_company_id
+    company_id = instance.__dict__.get('company_id', DEFERRED)
+    instance._original_company_id = company_id
+    if DEFERRED not in (old_company_id, company_id) and company_id != old_company_id:
+        profile_company_changed.send(sender=sender, instance=instance, old_company_id=old_company_id)
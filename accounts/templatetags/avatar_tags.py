@@ -0,0 +1,14 @@
+from django import template
+
+register = template.Library()
+
+
+@register.inclusion_tag('accounts/partials/avatar.html')
+def avatar(profile, size, css_class=''):
+    """Avatar de ``size`` píxeles con la miniatura adecuada (y la doble para pantallas HiDPI)"""
+    context = {'profile': profile, 'size': size, 'css_class': css_class}
+    if profile.avatar and profile.avatar_thumbnails == profile.avatar.name:
+        context['webp_srcset'] = f'{profile.avatar_url(size)} 1x, {profile.avatar_url(size * 2)} 2x'
+        context['jpeg_src'] = profile.avatar_url(size, 'jpg')
+        context['jpeg_srcset'] = f'{context["jpeg_src"]} 1x, {profile.avatar_url(size * 2, "jpg")} 2x'
+    return context
@@ -0,0 +1,221 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from coopconnect.testing import Post, QueryBudgetMixin, QueryBudgetSuite
+from messaging.models import Chat, ChatMembership
+from organizations.models import Company, Cooperative, SectorStats
+from .avatars import AVATAR_SIZES, generate_avatar_thumbnails, pending_thumbnails, pick_size, thumbnail_name
+from .models import Profile
+
+
+class DashboardETagTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='x')
+        self.client.force_login(self.user)
+
+    def test_not_modified_with_same_csrf_cookie(self):
+        self.client.cookies['csrftoken'] = 'a' * 32
+        etag = self.client.get(reverse('dashboard'))['ETag']
+        response = self.client.get(reverse('dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_csrf_cookie_changes_etag(self):
+        # Tras volver a iniciar sesión la cookie CSRF cambia: la página cacheada
+        # tiene un token del logout que ya no vale
+        self.client.cookies['csrftoken'] = 'a' * 32
+        etag = self.client.get(reverse('dashboard'))['ETag']
+        self.client.cookies['csrftoken'] = 'b' * 32
+        response = self.client.get(reverse('dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class DashboardDataTests(QueryBudgetMixin, TestCase):
+    def etag(self):
+        return self.client.get(reverse('dashboard'))['ETag']
+
+    def test_warm_request_only_reads_session_user_and_profile(self):
+        cache.clear()
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+
+    def test_joining_cooperative_changes_etag(self):
+        etag = self.etag()
+        cooperative = Cooperative.objects.create(name='Nueva', sector='tecnologia', description='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            cooperative.companies.add(self.data.company)
+        self.assertNotEqual(self.etag(), etag)
+        self.assertContains(self.client.get(reverse('dashboard')), 'Nueva')
+
+    def test_leaving_cooperative_from_company_side_changes_etag(self):
+        etag = self.etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.data.company.cooperatives.remove(self.data.cooperative)
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_renamed_cooperative_changes_etag(self):
+        etag = self.etag()
+        self.data.cooperative.name = 'Renombrada'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.data.cooperative.save()
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_new_chat_changes_etag(self):
+        etag = self.etag()
+        other = User.objects.create_user('bea')
+        with self.captureOnCommitCallbacks(execute=True):
+            Chat.objects.create(type='direct').participants.add(self.user, other)
+        self.assertNotEqual(self.etag(), etag)
+
+
+class ProfileCompanyChangeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='x')
+        self.company = Company.objects.create(name='Acme', sector='tecnologia', description='x')
+        self.chat = Chat.objects.create(type='company', company=self.company)
+        SectorStats.objects.update_or_create(sector='tecnologia', defaults={'dirty': False})
+
+    def test_join_updates_memberships_and_sector_stats(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.company = self.company
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertTrue(ChatMembership.objects.filter(user=self.user, chat=self.chat).exists())
+        self.assertTrue(SectorStats.objects.get(sector='tecnologia').dirty)
+
+    def test_deferred_company_does_not_query(self):
+        profile = Profile.objects.only('avatar').get(user=self.user)
+        with self.assertNumQueries(1):
+            profile.save(update_fields=['avatar'])
+
+
+def photo(name='foto.jpg', size=(600, 400)):
+    """JPEG apaisado con EXIF: cámara y orientación 6 (girar 90° para verlo derecho)"""
+    exif = Image.Exif()
+    exif[0x010F] = 'Cámara de prueba'
+    exif[0x0112] = 6
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class AvatarThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, BACKGROUND_TASKS='off')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('ana', password='x')
+        self.profile = self.user.profile
+
+    def upload(self, name='foto.jpg', **kwargs):
+        self.profile.avatar = photo(name, **kwargs)
+        self.profile.save()
+        return self.profile.avatar.name
+
+    def thumbnails(self, name):
+        return [thumbnail_name(name, size, extension) for size in AVATAR_SIZES for extension in ('webp', 'jpg')]
+
+    def test_generates_square_thumbnails_without_exif(self):
+        name = self.upload()
+        generate_avatar_thumbnails(self.profile.pk)
+
+        for path in self.thumbnails(name):
+            with self.subTest(path=path), default_storage.open(path) as thumbnail:
+                image = Image.open(thumbnail)
+                size = int(path.rsplit('_', 1)[1].split('.')[0])
+                self.assertEqual(image.size, (size, size))
+                self.assertEqual(dict(image.getexif()), {})
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar_thumbnails, name)
+        self.assertEqual(pending_thumbnails(), [])
+
+    def test_is_idempotent(self):
+        name = self.upload()
+        generate_avatar_thumbnails(self.profile.pk)
+        with self.assertNumQueries(1):
+            generate_avatar_thumbnails(self.profile.pk)
+        self.assertEqual(sorted(default_storage.listdir('avatars')[1]), sorted(
+            path.split('/')[-1] for path in self.thumbnails(name) + [name]
+        ))
+
+    def test_new_avatar_deletes_previous_thumbnails(self):
+        old = self.upload('vieja.jpg')
+        generate_avatar_thumbnails(self.profile.pk)
+        self.profile.refresh_from_db()
+        new = self.upload('nueva.jpg')
+        self.assertEqual(pending_thumbnails(), [self.profile.pk])
+
+        generate_avatar_thumbnails(self.profile.pk)
+        self.assertFalse(any(default_storage.exists(path) for path in self.thumbnails(old)))
+        self.assertTrue(all(default_storage.exists(path) for path in self.thumbnails(new)))
+
+    def test_avatar_url_uses_original_until_thumbnails_exist(self):
+        self.assertEqual(self.profile.avatar_url(48), '')
+        name = self.upload()
+        self.assertEqual(self.profile.avatar_url(48), self.profile.avatar.url)
+
+        generate_avatar_thumbnails(self.profile.pk)
+        self.profile.refresh_from_db()
+        self.assertEqual(pick_size(40), 48)
+        self.assertEqual(pick_size(1000), 256)
+        self.assertEqual(self.profile.avatar_url(40), default_storage.url(thumbnail_name(name, 48, 'webp')))
+        self.assertEqual(self.profile.avatar_url(100, 'jpg'), default_storage.url(thumbnail_name(name, 256, 'jpg')))
+
+    def test_avatar_tag_offers_webp_with_jpeg_fallback(self):
+        template = engines.all()[0].from_string('{% load avatar_tags %}{% avatar profile 48 %}')
+        name = self.upload()
+        self.assertNotIn('<picture>', template.render({'profile': self.profile}))
+
+        generate_avatar_thumbnails(self.profile.pk)
+        self.profile.refresh_from_db()
+        html = template.render({'profile': self.profile})
+        self.assertIn(
+            f'srcset="{default_storage.url(thumbnail_name(name, 48, "webp"))} 1x, '
+            f'{default_storage.url(thumbnail_name(name, 96, "webp"))} 2x"', html,
+        )
+        self.assertIn(f'src="{default_storage.url(thumbnail_name(name, 48, "jpg"))}"', html)
+
+    @override_settings(BACKGROUND_TASKS='sync')
+    def test_profile_upload_generates_thumbnails_after_commit(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(reverse('accounts:profile'), {'avatar': photo(), 'bio': ''})
+        self.assertRedirects(response, reverse('accounts:profile'))
+        self.assertEqual(len(callbacks), 1)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar_thumbnails, self.profile.avatar.name)
+
+        # Sin avatar nuevo no se encarga nada
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('accounts:profile'), {'bio': 'Hola'})
+        self.assertEqual(callbacks, [])
+
+
+class QueryBudgetTests(QueryBudgetSuite, TestCase):
+    routes = ('accounts:', 'dashboard')
+
+    def budgets(self):
+        return {
+            reverse('dashboard'): 6,
+            reverse('accounts:profile'): 4,
+            Post(reverse('accounts:profile'), {'bio': 'Hola'}): 4,
+            reverse('accounts:login'): 0,
+            Post(reverse('accounts:login'), {'username': 'ana', 'password': 'x'}): 8,
+            Post(reverse('accounts:logout')): 4,
+            reverse('accounts:register'): 0,
+            Post(reverse('accounts:register'), {
+                'username': 'nueva', 'email': 'nueva@example.com',
+                'password1': 'clave-larga-2024', 'password2': 'clave-larga-2024',
+            }): 14,
+        }
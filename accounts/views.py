@@ -2,9 +2,16 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib import messages
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from .avatars import generate_avatar_thumbnails
 from .forms import UserRegisterForm, ProfileUpdateForm
-from organizations.models import Company, Cooperative
-from messaging.models import Chat
+from .models import Profile
+from coopconnect.tasks import enqueue
+from coopconnect.replica import read_from_replica
+from organizations.stats import company_cooperatives, site_stats
+from messaging.etags import csrf_secret, digest, has_pending_flash_messages
+from messaging.models import UserChatCount
 
 
 def register(request):
@@ -28,7 +35,10 @@ def profile(request):
     if request.method == 'POST':
         form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.profile)
         if form.is_valid():
-            form.save()
+            profile = form.save()
+            if 'avatar' in form.changed_data:
+                # Las miniaturas se generan fuera de la petición
+                enqueue(generate_avatar_thumbnails, profile.pk)
             messages.success(request, '¡Perfil actualizado exitosamente!')
             return redirect('accounts:profile')
     else:
@@ -40,19 +50,51 @@ def profile(request):
     return render(request, 'accounts/profile.html', context)
 
 
+def dashboard_data(request):
+    """Datos del dashboard, leídos una vez por petición: los usan el ETag y la vista
+
+    Los totales del sitio, los chats del usuario y las cooperativas de la
+    empresa salen de la caché; solo el perfil (con su empresa) se consulta.
+    """
+    if not hasattr(request, '_dashboard_data'):
+        profile = Profile.objects.select_related('company').get(user=request.user)
+        request._dashboard_data = {
+            'profile': profile,
+            'company_cooperatives': company_cooperatives(profile.company_id) if profile.company_id else [],
+            'stats': site_stats(),
+            'user_chats_count': UserChatCount.for_user(request.user),
+        }
+    return request._dashboard_data
+
+
+def dashboard_etag(request):
+    """ETag del dashboard: los mismos datos que muestra la página"""
+    if has_pending_flash_messages(request):
+        return None
+    data = dashboard_data(request)
+    company = data['profile'].company
+    return digest(
+        request.user.pk, request.user.username,
+        company and (company.pk, company.name, company.sector),
+        data['company_cooperatives'],
+        data['stats']['companies'], data['stats']['cooperatives'], data['user_chats_count'],
+        csrf_secret(request),
+    )
+
+
 @login_required
+@read_from_replica
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dashboard_etag)
 def dashboard(request):
     """Dashboard principal después del login"""
-    # Contar estadísticas
-    companies_count = Company.objects.count()
-    cooperatives_count = Cooperative.objects.count()
-    user_chats_count = Chat.objects.filter(participants=request.user).count()
-    
+    data = dashboard_data(request)
     context = {
         'user': request.user,
-        'profile': request.user.profile,
-        'companies_count': companies_count,
-        'cooperatives_count': cooperatives_count,
-        'user_chats_count': user_chats_count,
+        'profile': data['profile'],
+        'company_cooperatives': data['company_cooperatives'],
+        'companies_count': data['stats']['companies'],
+        'cooperatives_count': data['stats']['cooperatives'],
+        'user_chats_count': data['user_chats_count'],
     }
     return render(request, 'dashboard.html', context)
@@ -0,0 +1,11 @@
+"""
+URLs del admin, importadas recién en la primera petición a /admin/.
+
+Con ``SimpleAdminConfig`` no se ejecuta ``autodiscover`` al arrancar; se
+hace aquí, la primera vez que el resolver necesita estas rutas.
+"""
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CoopconnectConfig(AppConfig):
+    """App del proyecto: aloja los comandos de medición del arranque en frío"""
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'coopconnect'
+    verbose_name = 'CoopConnect'
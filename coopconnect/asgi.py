@@ -3,6 +3,12 @@ ASGI config for coopconnect project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving the project through ASGI (e.g. ``uvicorn coopconnect.asgi:application``)
+enables the Server-Sent Events stream at ``messaging:chat_stream``; under WSGI
+the chat page falls back to polling. The messaging hot path (chat list, polling
+and sending) is written as async views, so pollers do not hold a thread each.
+Compare deployments with ``manage.py load_test_polling <url>``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,163 @@
+"""
+Utilidades comunes sobre la caché configurada en ``CACHES`` (ver ``CACHE_URL``).
+
+* ``cached(key, compute, timeout)``: lee o calcula un valor con protección
+  contra estampidas. Cada entrada guarda su vencimiento "blando"; pasado ese
+  momento un solo proceso la recalcula (el que gana un lock con
+  ``cache.add``) mientras los demás siguen sirviendo la copia anterior. Si no
+  hay copia, los perdedores esperan un momento a que el ganador la escriba
+  antes de calcularla ellos mismos.
+* ``scope_version`` / ``bump_versions``: versiones por ámbito (p. ej. un
+  usuario) para invalidar de una vez todas las claves que dependen de él.
+  Pasar la versión a ``cached(..., version=...)``.
+
+Las vistas async usan las variantes ``acached``, ``ascope_version`` y
+``abump_versions``, con la API async de la caché.
+
+Funciona igual con cualquier backend: memoria local, archivos o Redis.
+"""
+import asyncio
+import time
+
+from django.core.cache import cache
+from .timing import record_cache
+
+LOCK_TIMEOUT = 10
+# Espera máxima de un proceso que perdió el lock y no tiene copia que servir
+LOCK_WAIT = 0.5
+LOCK_POLL_INTERVAL = 0.05
+# Tiempo extra que la copia vencida sigue disponible mientras se recalcula
+STALE_GRACE = 60
+
+
+def _lock_key(key, version):
+    return f'lock:{key}:{version}'
+
+
+def cached(key, compute, timeout, version=None):
+    """Valor de ``key`` desde la caché, o ``compute()`` si falta o venció"""
+    entry = cache.get(key, version=version)
+    if entry is not None:
+        value, soft_expires = entry
+        if soft_expires > time.time() or not cache.add(_lock_key(key, version), 1, LOCK_TIMEOUT):
+            # Vigente, o vencida pero otro proceso ya la está recalculando
+            record_cache(hits=1)
+            return value
+        record_cache(misses=1)
+        return _compute_and_store(key, compute, timeout, version)
+
+    record_cache(misses=1)
+
+    if cache.add(_lock_key(key, version), 1, LOCK_TIMEOUT):
+        return _compute_and_store(key, compute, timeout, version)
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key, version=version)
+        if entry is not None:
+            return entry[0]
+    return compute()
+
+
+def _compute_and_store(key, compute, timeout, version):
+    try:
+        value = compute()
+        cache.set(key, (value, time.time() + timeout), timeout + STALE_GRACE, version=version)
+        return value
+    finally:
+        cache.delete(_lock_key(key, version))
+
+
+async def acached(key, compute, timeout, version=None):
+    """Como ``cached``, con ``compute`` async"""
+    entry = await cache.aget(key, version=version)
+    if entry is not None:
+        value, soft_expires = entry
+        if soft_expires > time.time() or not await cache.aadd(_lock_key(key, version), 1, LOCK_TIMEOUT):
+            record_cache(hits=1)
+            return value
+        record_cache(misses=1)
+        return await _acompute_and_store(key, compute, timeout, version)
+
+    record_cache(misses=1)
+
+    if await cache.aadd(_lock_key(key, version), 1, LOCK_TIMEOUT):
+        return await _acompute_and_store(key, compute, timeout, version)
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        entry = await cache.aget(key, version=version)
+        if entry is not None:
+            return entry[0]
+    return await compute()
+
+
+async def _acompute_and_store(key, compute, timeout, version):
+    try:
+        value = await compute()
+        await cache.aset(key, (value, time.time() + timeout), timeout + STALE_GRACE, version=version)
+        return value
+    finally:
+        await cache.adelete(_lock_key(key, version))
+
+
+def invalidate(*keys):
+    """Descartar las claves indicadas (sin versión)"""
+    cache.delete_many(keys)
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def _new_version():
+    # Si la caché desaloja el contador, la versión nueva no debe coincidir con
+    # una ya usada (volverían a leerse entradas obsoletas), por eso no parte de 0
+    return time.time_ns()
+
+
+def scope_version(scope):
+    """Versión actual del ámbito ``scope``"""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+async def ascope_version(scope):
+    key = _version_key(scope)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _new_version(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_versions(scopes):
+    """Invalidar todas las claves versionadas de los ámbitos indicados
+
+    ``incr`` es atómico (Redis, memoria local): dos invalidaciones simultáneas
+    producen dos versiones distintas, nunca la misma ``v+1``.
+    """
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Sin contador: empezar uno nuevo (o incrementar el que otro acaba de crear)
+            if not cache.add(key, _new_version(), None):
+                cache.incr(key)
+
+
+async def abump_versions(scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            if not await cache.aadd(key, _new_version(), None):
+                await cache.aincr(key)
@@ -0,0 +1,110 @@
+"""
+Sonda de arranque en frío, ejecutada en un proceso nuevo.
+
+Los comandos ``check_cold_start`` y ``bench_cold_start`` lanzan
+``python -m coopconnect.coldstart <modo>`` para medir un arranque real:
+
+* ``audit``: importa ``api.index`` con un audit hook y la salida capturada,
+  e informa toda E/S hecha durante la importación (red, base de datos,
+  escrituras a disco, subprocesos, prints).
+* ``request <ruta> [cookie]``: importa ``api.index`` y atiende una petición
+  GET. Escribe ``first-byte`` apenas recibe el primer trozo de la respuesta,
+  para que el proceso padre mida el TTFB desde el inicio del intérprete.
+
+El resultado se escribe como una línea JSON en stdout.
+
+Este módulo no debe importar Django a nivel de módulo: mediría su propia
+importación.
+"""
+import io
+import json
+import sys
+import time
+
+# Eventos de auditoría que indican E/S real durante la importación
+IO_EVENTS = {
+    'socket.connect', 'socket.getaddrinfo', 'socket.gethostbyname', 'socket.sendto',
+    'sqlite3.connect', 'subprocess.Popen', 'os.system', 'os.exec', 'os.spawn',
+    'urllib.Request', 'http.client.connect',
+}
+WRITE_MODES = set('wax+')
+
+
+def audit():
+    events = []
+
+    def hook(event, args):
+        if event in IO_EVENTS:
+            events.append(f'{event} {args[0]!r}' if args else event)
+        elif event == 'open' and len(args) > 1 and isinstance(args[1], str) and WRITE_MODES & set(args[1]):
+            events.append(f'open {args[0]!r} ({args[1]})')
+
+    sys.addaudithook(hook)
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = captured = io.StringIO()
+    try:
+        import api.index as index
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+    from django.db import connections
+    open_connections = [alias for alias in connections if connections[alias].connection is not None]
+    return {
+        'timings': index.timings,
+        'modules': len(sys.modules),
+        'io_events': events,
+        'db_connections': open_connections,
+        'output': captured.getvalue(),
+    }
+
+
+def wsgi_environ(path, cookie=''):
+    """Environ WSGI mínimo de una petición GET a ``path``"""
+    path, _, query = path.partition('?')
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_COOKIE': cookie,
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+
+def request(path, cookie=''):
+    import api.index as index
+
+    environ = wsgi_environ(path, cookie)
+    status = []
+    started = time.perf_counter()
+    response = index.app(environ, lambda response_status, headers, exc_info=None: status.append(response_status))
+    try:
+        for chunk in response:
+            if chunk:
+                break
+        print('first-byte', flush=True)
+        request_ms = round((time.perf_counter() - started) * 1000, 1)
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return {'timings': index.timings, 'request': request_ms, 'status': status[0] if status else None}
+
+
+def main(argv):
+    mode, *args = argv
+    result = audit() if mode == 'audit' else request(*args)
+    print(json.dumps(result), flush=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
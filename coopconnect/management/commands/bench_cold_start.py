@@ -0,0 +1,106 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = ('Mide el tiempo hasta el primer byte en arranques en frío de /, /dashboard/ '
+            'y el polling del chat (un proceso nuevo por petición)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Arranques por ruta')
+        parser.add_argument('--username', help='Usuario para las rutas autenticadas (por defecto, el primero)')
+        parser.add_argument('--chat', type=int, help='Chat para el polling (por defecto, el primero accesible)')
+        parser.add_argument('--imports', type=int, nargs='?', const=15, default=0, metavar='N',
+                            help='Mostrar los N paquetes que más tardan en importarse (-X importtime)')
+
+    def handle(self, *args, **options):
+        from messaging.models import Chat
+
+        User = get_user_model()
+        users = User.objects.filter(is_active=True).order_by('pk')
+        user = users.filter(username=options['username']).first() if options['username'] else users.first()
+        if user is None:
+            raise CommandError('Se necesita un usuario activo para medir las rutas autenticadas.')
+
+        chats = Chat.objects.accessible_by(user)
+        chat = chats.filter(pk=options['chat']).first() if options['chat'] else chats.order_by('pk').first()
+        paths = ['/', reverse('dashboard')]
+        if chat is None:
+            self.stderr.write(f'{user.username} no tiene chats: se omite el polling.')
+        else:
+            paths.append(f'{reverse("messaging:chat_messages", args=[chat.pk])}?after={chat.last_message_id or 0}')
+
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        try:
+            for path in paths:
+                cookie = '' if path == '/' else f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+                self.report(path, [self.cold_request(path, cookie) for _ in range(options['runs'])])
+        finally:
+            session.delete()
+
+        if options['imports']:
+            self.report_imports(options['imports'])
+
+    def cold_request(self, path, cookie):
+        """TTFB medido desde fuera: del arranque del intérprete al primer byte"""
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'coopconnect.coldstart', 'request', path, cookie],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        ttfb = None
+        for line in iter(process.stdout.readline, ''):
+            if line.strip() == 'first-byte':
+                ttfb = (time.perf_counter() - started) * 1000
+                break
+        out = process.stdout.read()
+        err = process.stderr.read()
+        process.wait()
+        if process.returncode != 0 or ttfb is None:
+            raise CommandError(f'Falló la petición a {path}:\n{err}')
+        result = json.loads(out.splitlines()[-1])
+        result['ttfb'] = ttfb
+        return result
+
+    def report(self, path, results):
+        ttfb = sorted(result['ttfb'] for result in results)
+        boot = statistics.median(result['timings']['total'] for result in results)
+        request = statistics.median(result['request'] for result in results)
+        statuses = ', '.join(sorted({result['status'] for result in results}))
+        self.stdout.write(
+            f'{path}\n'
+            f'  TTFB: mín {ttfb[0]:.0f} ms, mediana {statistics.median(ttfb):.0f} ms, máx {ttfb[-1]:.0f} ms\n'
+            f'  mediana en proceso: arranque {boot:.0f} ms + petición {request:.0f} ms ({statuses})'
+        )
+
+    def report_imports(self, top):
+        """Tiempo propio de importación agrupado por paquete de primer nivel"""
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import api.index'],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        per_package = defaultdict(int)
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, _, name = line.removeprefix('import time:').split('|')
+            per_package[name.strip().split('.')[0]] += int(self_us)
+
+        self.stdout.write(f'Importaciones (tiempo propio, top {top}):')
+        for package, us in sorted(per_package.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f'  {package:<24} {us / 1000:7.1f} ms')
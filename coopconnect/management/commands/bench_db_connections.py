@@ -0,0 +1,145 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from coopconnect.coldstart import wsgi_environ
+from messaging.models import Chat
+
+MODES = ('persistent', 'pool', 'pooler')
+
+
+class Command(BaseCommand):
+    help = ('Compara la latencia (p50/p99) de /dashboard/ y el polling del chat con cada modo de '
+            'DATABASE_CONNECTIONS, en un proceso nuevo por modo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default=','.join(MODES), help='Modos a comparar, separados por comas')
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por ruta y modo')
+        parser.add_argument('--concurrency', type=int, default=4, help='Hilos que envían peticiones a la vez')
+        parser.add_argument('--username', help='Usuario para las peticiones (por defecto, el primero con chats)')
+        parser.add_argument('--chat', type=int, help='Chat a consultar (por defecto, el primero accesible)')
+        parser.add_argument('--child', nargs=2, metavar=('COOKIE', 'PATHS'), help='Uso interno: ejecutar un modo')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            cookie, paths = options['child']
+            result = run_requests(paths.split(','), cookie, options['requests'], options['concurrency'])
+            self.stdout.write(json.dumps(result))
+            return
+
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError('La comparación necesita PostgreSQL en DATABASE_URL.')
+        modes = options['modes'].split(',')
+        if unknown := set(modes) - set(MODES):
+            raise CommandError(f'Modos desconocidos: {", ".join(sorted(unknown))}')
+
+        user, paths = self.target(options['username'], options['chat'])
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+        try:
+            self.stdout.write(
+                f'{options["requests"]} peticiones por ruta, {options["concurrency"]} hilos, usuario {user.username}'
+            )
+            # Que el recuento de conexiones abiertas sea solo el de cada modo
+            connection.close()
+            for mode in modes:
+                self.report(mode, self.run_mode(mode, cookie, paths, options))
+        finally:
+            session.delete()
+
+    def target(self, username, chat_id):
+        users = get_user_model().objects.filter(is_active=True)
+        if username:
+            user = users.filter(username=username).first()
+        else:
+            user = users.filter(chat_memberships__isnull=False).order_by('pk').first()
+        if user is None:
+            raise CommandError('No hay un usuario con chats para las peticiones.')
+        chats = Chat.objects.accessible_by(user)
+        chat = chats.filter(pk=chat_id).first() if chat_id else chats.order_by('pk').first()
+        if chat is None:
+            raise CommandError(f'{user.username} no tiene acceso a ningún chat.')
+        poll = f'{reverse("messaging:chat_messages", args=[chat.pk])}?after={chat.last_message_id or 0}'
+        return user, [reverse('dashboard'), poll]
+
+    def run_mode(self, mode, cookie, paths, options):
+        result = subprocess.run(
+            [
+                sys.executable, settings.BASE_DIR / 'manage.py', 'bench_db_connections',
+                '--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+                '--child', cookie, ','.join(paths),
+            ],
+            env={**os.environ, 'DATABASE_CONNECTIONS': mode}, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Falló el modo {mode}:\n{result.stderr}')
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def report(self, mode, result):
+        self.stdout.write(f'{mode} ({result["backends"]} conexiones abiertas al terminar)')
+        for path, latencies in result['latencies'].items():
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            statuses = ', '.join(sorted(set(result['statuses'][path])))
+            self.stdout.write(
+                f'  {path:<45} p50 {statistics.median(latencies):6.1f} ms  p99 {p99:6.1f} ms  ({statuses})'
+            )
+
+
+def run_requests(paths, cookie, requests, concurrency):
+    """Enviar las peticiones a la aplicación WSGI desde varios hilos
+
+    Cada petición pasa por el ciclo completo (señales request_started y
+    request_finished), así que las conexiones se abren, reutilizan o
+    devuelven al pool igual que en un servidor real.
+    """
+    from django.core.wsgi import get_wsgi_application
+
+    app = get_wsgi_application()
+    latencies = {path: [] for path in paths}
+    statuses = {path: [] for path in paths}
+    lock = threading.Lock()
+
+    def worker(count):
+        for _ in range(count):
+            for path in paths:
+                status = []
+                started = time.perf_counter()
+                response = app(wsgi_environ(path, cookie), lambda s, headers, exc_info=None: status.append(s))
+                try:
+                    b''.join(response)
+                finally:
+                    response.close()
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies[path].append(elapsed)
+                    statuses[path].append(status[0])
+
+    threads = [
+        threading.Thread(target=worker, args=(requests // concurrency + (i < requests % concurrency),))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Conexiones que el proceso deja abiertas (incluye la de esta consulta)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()')
+        backends = cursor.fetchone()[0]
+    return {'latencies': latencies, 'statuses': statuses, 'backends': backends}
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Verifica que importar api/index.py no haga E/S (red, base de datos, escrituras, prints)'
+
+    def handle(self, *args, **options):
+        # Proceso nuevo: en este ya está todo importado
+        result = subprocess.run(
+            [sys.executable, '-m', 'coopconnect.coldstart', 'audit'],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'No se pudo importar api/index.py:\n{result.stderr}')
+        report = json.loads(result.stdout.splitlines()[-1])
+
+        phases = ', '.join(f'{phase} {ms} ms' for phase, ms in report['timings'].items())
+        self.stdout.write(f'Arranque: {phases}; {report["modules"]} módulos')
+
+        problems = [f'E/S: {event}' for event in report['io_events']]
+        problems += [f'Conexión a la base de datos abierta: {alias}' for alias in report['db_connections']]
+        if report['output']:
+            problems.append(f'Salida durante la importación:\n{report["output"].rstrip()}')
+        if problems:
+            raise CommandError('La importación hace E/S:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('La importación no hace E/S.'))
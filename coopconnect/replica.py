@@ -0,0 +1,141 @@
+"""
+Lecturas desde una réplica de la base de datos (``DATABASE_REPLICA_URL``).
+
+Solo las vistas marcadas con ``@read_from_replica`` leen de la réplica; el
+resto del sitio, todas las escrituras y las sesiones usan siempre la base
+principal. La réplica puede ir unos instantes atrasada, por eso:
+
+* Después de un POST (u otra petición que escribe) ``primary_pin_middleware``
+  guarda en la sesión hasta cuándo ese usuario debe seguir leyendo de la
+  principal (``REPLICA_PIN_SECONDS``), para que vea lo que acaba de escribir.
+  Las vistas GET que escriben llaman a ``pin_to_primary(request)``.
+* Dentro de una transacción en la principal las lecturas también van a ella.
+* Los modelos que alimentan cachés de larga duración (``PRIMARY_ONLY_MODELS``)
+  se leen siempre de la principal: un valor atrasado quedaría cacheado con
+  la versión nueva (p. ej. el acceso de un usuario recién quitado de un chat).
+
+Sin ``DATABASE_REPLICA_URL`` el router no se instala y el decorador y el
+middleware no hacen nada. En los tests la réplica existe siempre (un espejo de
+la base de pruebas) y los tests que la usan instalan el router con
+``override_settings(DATABASE_ROUTERS=...)``.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+REPLICA_DB_ALIAS = 'replica'
+ROUTER_PATH = 'coopconnect.replica.ReplicaRouter'
+PIN_SESSION_KEY = 'primary_until'
+# La sesión guarda la marca de la réplica: leerla de la réplica sería circular
+PRIMARY_ONLY_APPS = {'sessions'}
+# Membresías y contadores: sus lecturas rellenan cachés que duran horas
+PRIMARY_ONLY_MODELS = {'messaging.chatmembership', 'messaging.userchatcount', 'organizations.sitecounter'}
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_enabled():
+    return REPLICA_DB_ALIAS in settings.DATABASES and ROUTER_PATH in settings.DATABASE_ROUTERS
+
+
+class ReplicaRouter:
+    """Lecturas a la réplica solo dentro de una vista ``@read_from_replica``"""
+
+    def db_for_read(self, model, **hints):
+        if (
+            _use_replica.get()
+            and model._meta.app_label not in PRIMARY_ONLY_APPS
+            and model._meta.label_lower not in PRIMARY_ONLY_MODELS
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Ambas bases tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return db == DEFAULT_DB_ALIAS
+
+
+def pin_to_primary(request):
+    """Leer de la base principal durante ``REPLICA_PIN_SECONDS`` (tras escribir)"""
+    if replica_enabled():
+        request.session[PIN_SESSION_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+
+
+def _is_pinned(until):
+    return until is not None and until > time.time()
+
+
+def read_from_replica(view):
+    """Decorador: las consultas de lectura de la vista van a la réplica
+
+    Salvo que el usuario haya escrito hace poco (ver ``pin_to_primary``).
+    Sirve para vistas sync y async.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if not replica_enabled() or _is_pinned(await request.session.aget(PIN_SESSION_KEY)):
+                return await view(request, *args, **kwargs)
+            token = _use_replica.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not replica_enabled() or _is_pinned(request.session.get(PIN_SESSION_KEY)):
+                return view(request, *args, **kwargs)
+            token = _use_replica.set(True)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+    return wrapper
+
+
+def _wrote(request, response):
+    # Sesión vacía: visitante anónimo o logout, no hay a quién fijar
+    return (
+        request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        and response.status_code < 400
+        and not request.session.is_empty()
+    )
+
+
+@sync_and_async_middleware
+def primary_pin_middleware(get_response):
+    """Fijar al usuario en la base principal después de cada petición que escribe
+
+    Va después de SessionMiddleware, que guarda la marca en la sesión.
+    """
+    if not replica_enabled():
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            if _wrote(request, response):
+                await request.session.aset(PIN_SESSION_KEY, time.time() + settings.REPLICA_PIN_SECONDS)
+            return response
+    else:
+        def middleware(request):
+            response = get_response(request)
+            if _wrote(request, response):
+                pin_to_primary(request)
+            return response
+    return middleware
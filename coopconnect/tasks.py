@@ -0,0 +1,55 @@
+"""
+Tareas en segundo plano sin infraestructura adicional.
+
+El setting ``BACKGROUND_TASKS`` elige cómo se ejecutan las tareas encoladas,
+siempre después de confirmar la transacción en curso:
+
+* ``thread`` (por defecto): en un hilo del propio proceso, de a una.
+* ``sync``: en línea, dentro de la misma petición (pruebas, depuración).
+* ``off``: no se ejecutan. Sirve para entornos serverless donde el proceso
+  se congela al terminar la respuesta. Allí un comando programado retoma el
+  trabajo pendiente (p. ej. ``purge_deleted_organizations``).
+
+Las tareas deben ser idempotentes: pueden repetirse si el proceso muere a
+mitad de camino y el comando las retoma.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='background-task')
+        return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Falló la tarea en segundo plano %s', func.__qualname__)
+    finally:
+        # Las conexiones son por hilo: cerrar las que abrió la tarea
+        connections.close_all()
+
+
+def enqueue(func, *args, **kwargs):
+    """Ejecutar ``func(*args, **kwargs)`` en segundo plano al confirmar la transacción"""
+    mode = settings.BACKGROUND_TASKS
+    if mode == 'off':
+        return
+    if mode == 'sync':
+        transaction.on_commit(lambda: func(*args, **kwargs))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run, func, args, kwargs))
@@ -0,0 +1,77 @@
+"""
+Backend de plantillas que importa las librerías de tags bajo demanda.
+
+El backend estándar importa todos los módulos ``templatetags`` de las apps
+instaladas (admin, crispy_forms, ...) al preparar el motor, es decir, en la
+primera página que se renderiza. En un arranque en frío eso se paga aunque
+la página no use esas librerías. Aquí los nombres se descubren sin importar
+los módulos, y cada librería se importa la primera vez que una plantilla la
+carga con ``{% load %}``.
+
+Además cada render cuenta como tiempo de plantillas en las métricas de la
+petición (``coopconnect.timing``).
+"""
+from importlib.util import find_spec
+from pkgutil import iter_modules
+
+from django.apps import apps
+from django.template.backends.django import DjangoTemplates, Template
+from django.template.library import import_library
+from .timing import measure_template
+
+
+def lazy_template_tag_modules():
+    """Pares (nombre, módulo) de las librerías instaladas, sin importarlas"""
+    candidates = ['django.templatetags']
+    candidates.extend(f'{app_config.name}.templatetags' for app_config in apps.get_app_configs())
+    for candidate in candidates:
+        spec = find_spec(candidate)
+        if spec is None or spec.submodule_search_locations is None:
+            continue
+        for module in iter_modules(spec.submodule_search_locations):
+            if not module.ispkg:
+                yield module.name, f'{candidate}.{module.name}'
+
+
+class LazyLibraries(dict):
+    """{nombre: Library} que importa cada librería la primera vez que se pide"""
+
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = paths
+
+    def __missing__(self, name):
+        library = self[name] = import_library(self.paths[name])
+        return library
+
+    def __iter__(self):
+        # Para el mensaje de error de {% load %} con los nombres disponibles
+        return iter(self.paths)
+
+
+class LazyDjangoTemplates(DjangoTemplates):
+    def __init__(self, params):
+        super().__init__(params)
+        # El motor solo importó las librerías de OPTIONS: las de las apps se
+        # añaden por nombre y se importan en su primer {% load %}
+        engine = self.engine
+        engine.libraries = {**dict(lazy_template_tag_modules()), **engine.libraries}
+        template_libraries = LazyLibraries(engine.libraries)
+        template_libraries.update(engine.template_libraries)
+        engine.template_libraries = template_libraries
+
+    def get_templatetag_libraries(self, custom_libraries):
+        # Sin get_installed_libraries(), que importa todos los módulos templatetags
+        return dict(custom_libraries)
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with measure_template():
+            return super().render(context, request)
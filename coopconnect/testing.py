@@ -0,0 +1,210 @@
+"""
+Utilidades para los tests de presupuesto de consultas.
+
+``SiteData`` siembra empresas, cooperativas, miembros, chats y mensajes
+alrededor de un usuario; ``grow`` añade más filas. ``assertQueryBudgets``
+pide cada URL con la caché vacía (el peor caso) en cada escala de
+``SCALES`` y falla si la vista supera su presupuesto fijo: una consulta por
+fila (N+1) lo rompe en la escala grande.
+
+``QueryBudgetSuite`` recorre el URLconf: cada ruta de la app tiene un
+presupuesto o figura en ``opt_out`` con el motivo, de modo que una ruta
+nueva sin presupuesto hace fallar los tests.
+
+``htmx_elements`` lee los elementos con atributos ``hx-*`` de una respuesta,
+para comprobar sin navegador a qué elemento apuntan.
+"""
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.shortcuts import resolve_url
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, resolve
+from messaging.models import Chat, Message
+from organizations.models import Company, Cooperative
+
+# Escalas de los datos: el presupuesto debe cumplirse en ambas
+SCALES = (3, 30)
+
+
+class SiteData:
+    def __init__(self, user):
+        self.user = user
+        self.company = Company.objects.create(name='Propia', sector='tecnologia', description='x', created_by=user)
+        self.cooperative = Cooperative.objects.create(
+            name='Propia', sector='tecnologia', description='x', created_by=user,
+        )
+        self.cooperative.companies.add(self.company)
+        user.profile.company = self.company
+        user.profile.save()
+        self.company_chat = Chat.objects.create(type='company', company=self.company)
+        self.cooperative_chat = Chat.objects.create(type='cooperative', cooperative=self.cooperative)
+        self.first_message = Message.objects.create(chat=self.company_chat, sender=user, content='Hola')
+        self.rows = 0
+
+    def grow(self, rows):
+        """Añadir ``rows`` empresas, cooperativas, miembros, chats directos y mensajes"""
+        for i in range(self.rows, self.rows + rows):
+            # Sin contraseña: el hash es lo más lento de sembrar
+            member = User.objects.create_user(f'miembro{i}')
+            company = Company.objects.create(name=f'Empresa {i}', sector='tecnologia', description='x')
+            member.profile.company = company if i % 2 else self.company
+            member.profile.save()
+            cooperative = Cooperative.objects.create(name=f'Cooperativa {i}', sector='tecnologia', description='x')
+            cooperative.companies.add(company, self.company)
+            self.cooperative.companies.add(company)
+            direct = Chat.objects.create(type='direct')
+            direct.participants.add(self.user, member)
+            Message.objects.create(chat=direct, sender=member, content=f'Hola {i}')
+            Message.objects.create(chat=self.company_chat, sender=member, content=f'Mensaje {i}')
+        self.rows += rows
+
+
+class Post:
+    """Petición POST en un presupuesto: ``{Post(url, {'campo': 'valor'}): 5}``
+
+    ``status`` es la respuesta esperada (por defecto la redirección tras
+    guardar): un formulario inválido mediría otra rama de la vista.
+    """
+
+    def __init__(self, url, data=None, status=302):
+        self.url = url
+        self.data = data or {}
+        self.status = status
+
+    def __repr__(self):
+        return f'POST {self.url}'
+
+
+def route_names(patterns=None, namespace=''):
+    """Nombres de todas las rutas con nombre del URLconf (``app:ruta``)"""
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns, f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace)
+        elif pattern.name:
+            names.add(namespace + pattern.name)
+    return names
+
+
+def matches_route(name, entries):
+    """``name`` está en ``entries`` (nombres de ruta o espacios de nombres ``app:``)"""
+    return any(name == entry or (entry.endswith(':') and name.startswith(entry)) for entry in entries)
+
+
+class QueryBudgetMixin:
+    """Para TestCase: ``self.data`` gira alrededor del usuario con sesión iniciada"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('ana', password='x')
+        self.client.force_login(self.user)
+        self.data = SiteData(self.user)
+
+    def assertQueryBudget(self, url, budget):
+        """Pedir ``url`` (o ``Post``) y comprobar su presupuesto; lo que escriba se revierte"""
+        # Sesión nueva en cada petición: un logout previo no afecta a las siguientes
+        self.client.force_login(self.user)
+        cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                if isinstance(url, Post):
+                    response = self.client.post(url.url, url.data)
+                else:
+                    response = self.client.get(url)
+            transaction.set_rollback(True)
+        if isinstance(url, Post):
+            self.assertEqual(response.status_code, url.status, url)
+        else:
+            self.assertLess(response.status_code, 400, url)
+        # Una redirección al login mediría otra cosa
+        self.assertFalse(response.get('Location', '').startswith(resolve_url(settings.LOGIN_URL)), url)
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{url}: {len(queries)} consultas (presupuesto {budget}, {self.data.rows} filas)\n'
+            + '\n'.join(query['sql'] for query in queries),
+        )
+
+    def assertQueryBudgets(self, budgets):
+        """``budgets``: URL -> máximo de consultas (o una función que lo devuelve), en cada escala de ``SCALES``"""
+        for rows in SCALES:
+            self.data.grow(rows - self.data.rows)
+            for url, budget in (budgets() if callable(budgets) else budgets).items():
+                with self.subTest(url=url, rows=rows):
+                    self.assertQueryBudget(url, budget)
+
+
+class QueryBudgetSuite(QueryBudgetMixin):
+    """Presupuestos de todas las rutas de una app
+
+    ``routes``: rutas de la app (nombres o espacios ``app:``).
+    ``opt_out``: ruta -> motivo por el que no tiene presupuesto.
+    ``budgets()``: URL o ``Post`` -> máximo de consultas; se llama en cada escala.
+    """
+    routes = ()
+    opt_out = {}
+
+    def budgets(self):
+        raise NotImplementedError
+
+    def test_views_stay_within_query_budget(self):
+        self.assertQueryBudgets(self.budgets)
+
+    def test_every_route_has_a_budget(self):
+        owned = {name for name in route_names() if matches_route(name, self.routes)}
+        excluded = {name for name in owned if matches_route(name, self.opt_out)}
+        budgeted = {resolve(urlsplit(getattr(url, 'url', url)).path).view_name for url in self.budgets()}
+        self.assertEqual(budgeted, owned - excluded, 'rutas sin presupuesto ni motivo en opt_out')
+
+
+# Etiquetas sin cierre: no abren un nivel en el árbol
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class HtmxElement:
+    def __init__(self, tag, attrs, ancestors):
+        self.tag = tag
+        self.attrs = attrs
+        # (etiqueta, atributos) desde la raíz del fragmento
+        self.ancestors = ancestors
+
+    def closest(self, tag):
+        """Como ``closest <tag>`` de htmx: (profundidad en el fragmento, atributos), o None"""
+        chain = self.ancestors + [(self.tag, self.attrs)]
+        for depth in range(len(chain) - 1, -1, -1):
+            if chain[depth][0] == tag:
+                return depth, chain[depth][1]
+        return None
+
+
+class _HtmxParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.open_tags = []
+        self.elements = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if any(name.startswith('hx-') for name in attrs):
+            self.elements.append(HtmxElement(tag, attrs, list(self.open_tags)))
+        if tag not in VOID_ELEMENTS:
+            self.open_tags.append((tag, attrs))
+
+    def handle_endtag(self, tag):
+        # Cierra también las etiquetas que el HTML deja abiertas dentro
+        for depth in range(len(self.open_tags) - 1, -1, -1):
+            if self.open_tags[depth][0] == tag:
+                del self.open_tags[depth:]
+                return
+
+
+def htmx_elements(html):
+    """Elementos con atributos ``hx-*`` de ``html``, en orden de aparición"""
+    parser = _HtmxParser()
+    parser.feed(html)
+    parser.close()
+    return parser.elements
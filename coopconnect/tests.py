@@ -0,0 +1,208 @@
+import re
+import threading
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from coopconnect.cache import bump_versions, scope_version
+from coopconnect.template_backend import LazyDjangoTemplates
+from coopconnect.testing import QueryBudgetSuite, matches_route, route_names
+from coopconnect.timing import record_cache
+from coopconnect.replica import DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS, ROUTER_PATH, ReplicaRouter, _use_replica, replica_enabled
+from messaging.models import Chat, ChatMembership, Message, UserChatCount
+from organizations.models import Company, SiteCounter
+
+
+class ScopeVersionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_missing_version_starts_new_counter(self):
+        bump_versions(['user:1'])
+        self.assertIsNotNone(cache.get('version:user:1'))
+
+    def test_concurrent_bumps_all_produce_new_versions(self):
+        start = scope_version('user:1')
+        threads = [threading.Thread(target=bump_versions, args=(['user:1'],)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(scope_version('user:1'), start + 8)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def setUp(self):
+        token = _use_replica.set(True)
+        self.addCleanup(_use_replica.reset, token)
+
+    def test_replica_view_reads_from_replica(self):
+        self.assertEqual(self.router.db_for_read(Message), REPLICA_DB_ALIAS)
+
+    def test_cache_backing_models_read_from_primary(self):
+        for model in (ChatMembership, UserChatCount, SiteCounter):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(self.router.db_for_read(model), DEFAULT_DB_ALIAS)
+
+    def test_outside_replica_views_reads_from_primary(self):
+        _use_replica.set(False)
+        self.assertEqual(self.router.db_for_read(Message), DEFAULT_DB_ALIAS)
+
+
+@override_settings(DATABASE_ROUTERS=[ROUTER_PATH])
+class ReplicaReadTests(TransactionTestCase):
+    """Con dos bases: las comprobaciones de acceso no leen de la réplica"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.assertTrue(replica_enabled())
+        cache.clear()
+        self.user = User.objects.create_user('ana', password='x')
+        company = Company.objects.create(name='Acme', sector='tecnologia', description='x')
+        self.chat = Chat.objects.create(type='company', company=company)
+        self.user.profile.company = company
+        self.user.profile.save()
+        token = _use_replica.set(True)
+        self.addCleanup(_use_replica.reset, token)
+
+    def test_membership_reads_skip_replica(self):
+        with CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica_queries:
+            self.assertTrue(self.chat.user_can_access(self.user))
+            UserChatCount.for_user(self.user)
+            list(Message.objects.filter(chat=self.chat))
+        replica_sql = [query['sql'] for query in replica_queries]
+        self.assertEqual(len(replica_sql), 1)
+        self.assertIn('messaging_message', replica_sql[0])
+
+
+class LazyTemplateLibraryTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = LazyDjangoTemplates({
+            'NAME': 'lazy', 'DIRS': [], 'APP_DIRS': True,
+            'OPTIONS': {'libraries': {'propia': 'accounts.templatetags.avatar_tags'}},
+        })
+        self.libraries = self.backend.engine.template_libraries
+
+    def test_app_libraries_are_imported_on_first_load(self):
+        self.assertIn('avatar_tags', self.backend.engine.libraries)
+        self.assertNotIn('avatar_tags', self.libraries.keys())
+        self.backend.from_string('{% load avatar_tags %}')
+        self.assertIn('avatar_tags', self.libraries.keys())
+
+    def test_configured_libraries_and_builtins_still_work(self):
+        self.assertIn('propia', self.libraries.keys())
+        self.assertEqual(self.backend.from_string('{% load propia %}{{ 2|add:3 }}').render(), '5')
+
+
+class VendoredAssetTests(SimpleTestCase):
+    # Versión de htmx con la que se revisaron las plantillas; al actualizarla,
+    # revisar los atributos y eventos que usan (y los tests de los parciales)
+    HTMX_VERSION = '2.0.8'
+    # Atributos del núcleo de htmx 2 (hx-sse y hx-ws pasaron a extensiones)
+    HTMX_ATTRIBUTES = {
+        'boost', 'confirm', 'delete', 'disable', 'disabled-elt', 'disinherit', 'encoding', 'ext', 'get',
+        'headers', 'history', 'history-elt', 'include', 'indicator', 'inherit', 'params', 'patch', 'post',
+        'preserve', 'prompt', 'push-url', 'put', 'replace-url', 'request', 'select', 'select-oob', 'swap',
+        'swap-oob', 'sync', 'target', 'trigger', 'validate', 'vals',
+    }
+
+    def templates(self):
+        return {path: path.read_text() for path in (settings.BASE_DIR / 'templates').rglob('*.html')}
+
+    def test_vendored_htmx_is_the_reviewed_version(self):
+        htmx = (settings.BASE_DIR / 'static/vendor/htmx/htmx.min.js').read_text()
+        self.assertIn(f'version:"{self.HTMX_VERSION}"', htmx)
+
+    def test_templates_use_only_htmx_2_attributes(self):
+        for path, html in self.templates().items():
+            for name in re.findall(r'\shx-([\w:.-]+)=', html):
+                with self.subTest(template=path.name, attribute=name):
+                    # hx-on="evento: ..." de 1.x ya no existe: solo hx-on:evento / hx-on::evento
+                    self.assertTrue(name.startswith('on:') or name in self.HTMX_ATTRIBUTES, name)
+
+    def test_assets_are_served_from_static(self):
+        for path, html in self.templates().items():
+            with self.subTest(template=path.name):
+                self.assertNotRegex(html, r'<(script|link)[^>]+(src|href)="(https?:)?//')
+
+
+@override_settings(SERVER_TIMING_HEADER=True)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana', password='x')
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        """Respuesta y métricas registradas de la petición"""
+        with self.assertLogs('coopconnect.timing', 'DEBUG') as logs:
+            response = self.client.get(url)
+        return response, logs.records[-1].request_metrics
+
+    def test_header_and_log_line_report_the_same_request(self):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response, metrics = self.get(reverse('dashboard'))
+        self.assertEqual(metrics['path'], reverse('dashboard'))
+        self.assertEqual(metrics['status'], 200)
+        self.assertEqual(metrics['db_queries'], len(queries))
+        self.assertGreater(metrics['template_ms'], 0)
+        self.assertIn(f'db;dur={metrics["db_ms"]:.1f};desc="{len(queries)} consultas"', response['Server-Timing'])
+        self.assertIn(f'total;dur={metrics["total_ms"]:.1f}', response['Server-Timing'])
+
+    def test_counts_cache_hits_and_misses(self):
+        _, cold = self.get(reverse('dashboard'))
+        _, warm = self.get(reverse('dashboard'))
+        self.assertGreater(cold['cache_misses'], 0)
+        self.assertEqual(warm['cache_misses'], 0)
+        self.assertEqual(warm['cache_hits'], cold['cache_misses'])
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_is_optional(self):
+        response, metrics = self.get(reverse('home'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics['db_queries'], 0)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_their_call_site(self):
+        with self.assertLogs('coopconnect.timing', 'WARNING') as logs:
+            self.client.get(reverse('dashboard'))
+        self.assertTrue(logs.output)
+        self.assertTrue(all('Consulta lenta' in line for line in logs.output))
+        self.assertTrue(any('accounts/views.py' in line for line in logs.output), logs.output)
+
+    def test_request_line_is_not_logged_by_default(self):
+        with self.assertNoLogs('coopconnect.timing', 'INFO'):
+            response = self.client.get(reverse('home'))
+        self.assertIn('Server-Timing', response)
+
+    def test_nothing_is_measured_outside_a_request(self):
+        record_cache(hits=1)
+        with self.assertNoLogs('coopconnect.timing'):
+            with override_settings(SLOW_QUERY_MS=0):
+                User.objects.count()
+
+
+class QueryBudgetTests(QueryBudgetSuite, TestCase):
+    routes = ('home', 'admin:')
+    opt_out = {
+        'admin:': 'Admin de Django: solo lo usa el staff y sus consultas las decide Django',
+    }
+
+    def budgets(self):
+        return {reverse('home'): 0}
+
+    def test_every_route_belongs_to_one_suite(self):
+        # Las suites de cada app se registran al importar sus tests
+        for app in ('accounts', 'messaging', 'organizations'):
+            import_module(f'{app}.tests')
+        suites = QueryBudgetSuite.__subclasses__()
+        for name in route_names():
+            owners = [suite.__module__ for suite in suites if matches_route(name, suite.routes)]
+            self.assertEqual(len(owners), 1, f'{name}: {owners}')
@@ -0,0 +1,163 @@
+"""
+Métricas de rendimiento por petición.
+
+``server_timing_middleware`` mide en cada petición:
+
+* consultas SQL y tiempo en la base de datos (un ``execute_wrapper`` que se
+  instala en cada conexión al abrirse),
+* tiempo renderizando plantillas (``LazyDjangoTemplates``),
+* aciertos y fallos de caché (``coopconnect.cache`` y las burbujas del chat),
+* tiempo total de la petición.
+
+El resultado va en la cabecera ``Server-Timing`` (visible en las DevTools
+del navegador; solo con ``SERVER_TIMING_HEADER``) y en una línea JSON de nivel
+DEBUG del logger ``coopconnect.timing`` (``REQUEST_LOG_LEVEL=DEBUG`` para
+verla). Las consultas que tardan ``SLOW_QUERY_MS`` o más se registran aparte,
+como WARNING, con su SQL y la línea de código que las lanzó.
+
+Las métricas viajan en una ContextVar, así que también cuentan las consultas
+que las vistas async hacen en hilos (``sync_to_async``) y fuera de una
+petición no se mide nada.
+"""
+import json
+import logging
+import os
+import time
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import django
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+_metrics = ContextVar('request_metrics', default=None)
+
+# Rutas que no cuentan como "la línea que lanzó la consulta"
+_LIBRARY_PATHS = (os.path.dirname(django.__file__), os.path.dirname(os.__file__), __file__)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.rendering = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def record_cache(hits=0, misses=0):
+    """Sumar aciertos y fallos de caché a la petición en curso"""
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+@contextmanager
+def measure_template():
+    """Contar el bloque como tiempo de plantillas (sin duplicar las anidadas)"""
+    metrics = _metrics.get()
+    if metrics is None or metrics.rendering:
+        yield
+        return
+    metrics.rendering = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.template_ms += (time.perf_counter() - started) * 1000
+        metrics.rendering = False
+
+
+def _call_site():
+    """Primera línea fuera de Django y de la biblioteca estándar en la pila"""
+    for frame in reversed(traceback.extract_stack()):
+        if not frame.filename.startswith(_LIBRARY_PATHS) and 'site-packages' not in frame.filename:
+            return f'{os.path.relpath(frame.filename, settings.BASE_DIR)}:{frame.lineno} ({frame.name})'
+    return 'desconocido'
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: tiempo de cada consulta de la petición en curso"""
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        metrics.queries += 1
+        metrics.db_ms += elapsed
+        if elapsed >= settings.SLOW_QUERY_MS:
+            logger.warning(
+                'Consulta lenta (%.1f ms, %s) en %s: %s',
+                elapsed, context['connection'].alias, _call_site(), sql,
+            )
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    # Los wrappers viven en el objeto de la conexión, que sobrevive a reconexiones
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(_install_query_wrapper)
+
+
+def _finish(request, response, metrics):
+    total_ms = (time.perf_counter() - metrics.started) * 1000
+    if settings.SERVER_TIMING_HEADER:
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} consultas"',
+            f'tpl;dur={metrics.template_ms:.1f};desc="plantillas"',
+            f'cache;desc="{metrics.cache_hits} aciertos, {metrics.cache_misses} fallos"',
+            f'total;dur={total_ms:.1f}',
+        ])
+    fields = {
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'total_ms': round(total_ms, 1),
+        'db_queries': metrics.queries,
+        'db_ms': round(metrics.db_ms, 1),
+        'template_ms': round(metrics.template_ms, 1),
+        'cache_hits': metrics.cache_hits,
+        'cache_misses': metrics.cache_misses,
+    }
+    logger.debug(json.dumps(fields), extra={'request_metrics': fields})
+    return response
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """Medir cada petición y publicar las métricas (ver el docstring del módulo)
+
+    En respuestas en streaming (SSE) el total llega hasta que empieza el stream.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = _metrics.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                _metrics.reset(token)
+            return _finish(request, response, metrics)
+    else:
+        def middleware(request):
+            metrics = RequestMetrics()
+            token = _metrics.set(metrics)
+            try:
+                response = get_response(request)
+            finally:
+                _metrics.reset(token)
+            return _finish(request, response, metrics)
+    return middleware
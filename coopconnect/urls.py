@@ -14,20 +14,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
-from django.urls import path, include
+from django.urls import URLResolver, path, include
+from django.urls.resolvers import RoutePattern
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
 from accounts.views import dashboard
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', TemplateView.as_view(template_name='landing.html'), name='home'),
     path('dashboard/', dashboard, name='dashboard'),
     path('accounts/', include('accounts.urls')),
     path('organizations/', include('organizations.urls')),
     path('messaging/', include('messaging.urls')),
+    # Admin diferido: el resolver importa coopconnect.admin_urls (y hace el
+    # autodiscover) recién cuando una petición llega a /admin/
+    URLResolver(RoutePattern('admin/'), 'coopconnect.admin_urls', app_name='admin', namespace='admin'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,51 @@
+"""
+Caché de los chats accesibles por cada usuario.
+
+El conjunto de ids se calcula una vez por usuario (desde ChatMembership) y
+se guarda en la caché bajo una clave versionada por usuario (ver
+coopconnect.cache). Cada cambio de membresía (ver messaging.membership)
+incrementa la versión de los usuarios afectados, de modo que la siguiente
+consulta lo recalcula. Con una caché por proceso (locmem) la invalidación
+no llega a los demás procesos, así que allí la copia dura solo
+``CHAT_ACCESS_CACHE_SECONDS`` (unos segundos por defecto).
+"""
+from django.conf import settings
+from coopconnect.cache import abump_versions, acached, ascope_version, bump_versions, cached, scope_version
+
+
+def _scope(user_id):
+    return f'chat-access:{user_id}'
+
+
+def accessible_chat_ids(user):
+    """Ids de los chats a los que el usuario tiene acceso (cacheado)"""
+    from .models import ChatMembership
+
+    scope = _scope(user.id)
+    return cached(
+        scope,
+        lambda: frozenset(ChatMembership.objects.filter(user=user).values_list('chat_id', flat=True)),
+        settings.CHAT_ACCESS_CACHE_SECONDS,
+        version=scope_version(scope),
+    )
+
+
+async def aaccessible_chat_ids(user):
+    """Versión async de ``accessible_chat_ids``"""
+    from .models import ChatMembership
+
+    async def compute():
+        chat_ids = ChatMembership.objects.filter(user=user).values_list('chat_id', flat=True)
+        return frozenset([chat_id async for chat_id in chat_ids])
+
+    scope = _scope(user.id)
+    return await acached(scope, compute, settings.CHAT_ACCESS_CACHE_SECONDS, version=await ascope_version(scope))
+
+
+def invalidate_chat_access(user_ids):
+    """Invalidar el conjunto cacheado de los usuarios indicados"""
+    bump_versions(_scope(user_id) for user_id in user_ids)
+
+
+async def ainvalidate_chat_access(user_ids):
+    await abump_versions(_scope(user_id) for user_id in user_ids)
@@ -4,8 +4,9 @@ from .models import Chat, Message
 
 @admin.register(Chat)
 class ChatAdmin(admin.ModelAdmin):
-    list_display = ['id', 'type', 'company', 'cooperative', 'created_at']
+    list_display = ['id', 'type', 'company', 'cooperative', 'message_count', 'last_message_at', 'created_at']
     list_filter = ['type', 'created_at']
+    readonly_fields = ['last_message_at', 'last_message_id', 'last_message_preview', 'message_count']
     filter_horizontal = ['participants']
 
 
@@ -0,0 +1,159 @@
+"""
+Pub/sub de mensajes nuevos para el canal Server-Sent Events.
+
+El broker se elige con el setting ``MESSAGING_BROKER``:
+
+* ``InProcessBroker``: reparte los avisos entre las conexiones abiertas en
+  el mismo proceso. Es el valor por defecto y el que se usa en pruebas.
+* ``PostgresBroker``: publica con ``NOTIFY`` y escucha con ``LISTEN`` en un
+  hilo dedicado, de modo que varios procesos reciben los mismos avisos.
+
+Los avisos solo contienen ``(chat_id, message_id)``; el stream vuelve a
+leer los mensajes desde la base de datos.
+"""
+import asyncio
+import logging
+import select
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Suscripción de una conexión SSE a los avisos de un chat"""
+
+    def __init__(self, broker, chat_id):
+        self.broker = broker
+        self.chat_id = chat_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def notify(self, message_id):
+        # Puede llamarse desde cualquier hilo (vista síncrona, listener, ...)
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message_id)
+
+    async def wait(self, timeout):
+        """Esperar un aviso; devuelve el id del mensaje o None si vence el plazo"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class BaseBroker:
+    """Interfaz común de los brokers"""
+
+    def publish(self, chat_id, message_id):
+        raise NotImplementedError
+
+    def subscribe(self, chat_id):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    """Fan-out en memoria entre las suscripciones del proceso actual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, chat_id, message_id):
+        self.dispatch(chat_id, message_id)
+
+    def dispatch(self, chat_id, message_id):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(chat_id, ()))
+        for subscription in subscriptions:
+            subscription.notify(message_id)
+
+    def subscribe(self, chat_id):
+        subscription = Subscription(self, chat_id)
+        with self._lock:
+            self._subscriptions.setdefault(chat_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.chat_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.chat_id]
+
+
+class PostgresBroker(InProcessBroker):
+    """Broker entre procesos basado en LISTEN/NOTIFY de PostgreSQL"""
+
+    channel = 'coopconnect_messages'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, chat_id, message_id):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, f'{chat_id}:{message_id}'])
+
+    def subscribe(self, chat_id):
+        self._ensure_listener()
+        return super().subscribe(chat_id)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen_forever, name='messaging-listener', daemon=True)
+                self._listener.start()
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception('Listener de PostgreSQL caído; reintentando')
+                time.sleep(1)
+
+    def _listen(self):
+        # Conexión dedicada, fuera del ciclo de vida de las peticiones
+        wrapper = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            wrapper.ensure_connection()
+            wrapper.set_autocommit(True)
+            raw = wrapper.connection
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            while True:
+                for payload in self._read_notifies(raw):
+                    chat_id, _, message_id = payload.partition(':')
+                    self.dispatch(int(chat_id), int(message_id))
+        finally:
+            wrapper.close()
+
+    def _read_notifies(self, raw, timeout=5):
+        if hasattr(raw, 'poll'):
+            # psycopg2
+            if select.select([raw], [], [], timeout)[0]:
+                raw.poll()
+                while raw.notifies:
+                    yield raw.notifies.pop(0).payload
+        else:
+            # psycopg 3
+            for notify in raw.notifies(timeout=timeout):
+                yield notify.payload
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Instancia única del broker configurado en MESSAGING_BROKER"""
+    return import_string(settings.MESSAGING_BROKER)()
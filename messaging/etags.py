@@ -0,0 +1,106 @@
+"""
+Validadores ETag baratos para las vistas que se consultan con frecuencia.
+
+Se usan con ``django.views.decorators.http.condition``: si el cliente envía
+``If-None-Match`` con el mismo valor, Django responde 304 sin ejecutar la
+vista, es decir, sin cargar ni renderizar mensajes. Las vistas async usan
+``async_condition`` con las variantes async de los validadores.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from accounts.models import Profile
+from .models import Chat, ChatReadState
+
+
+def digest(*parts):
+    """Resumir las partes de un validador en un valor corto"""
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def csrf_secret(request):
+    """Secreto CSRF de la petición (cambia al iniciar sesión)
+
+    Las páginas completas incluyen el formulario de logout con ``{% csrf_token %}``:
+    sin esta parte, tras cerrar sesión y volver a entrar un 304 haría que el
+    navegador reutilice una página con un token que ya no vale.
+    """
+    return request.META.get('CSRF_COOKIE')
+
+
+def has_pending_flash_messages(request):
+    """Los mensajes flash se muestran una sola vez: con mensajes pendientes no se responde 304"""
+    return len(get_messages(request)) > 0
+
+
+def async_condition(etag_func):
+    """``condition(etag_func=...)`` para vistas async, con ``etag_func`` async
+
+    El ``condition`` de Django acepta vistas async pero llama a la función
+    de ETag de forma síncrona, donde el ORM no está permitido.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                # Un error (403, 404...) no lleva validador: no debe revelar nada del recurso
+                if not 200 <= response.status_code < 300:
+                    return response
+            if etag and request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+async def ainbox_version(user):
+    """Valor que cambia cuando cambia algo visible en la bandeja del usuario"""
+    summary = await Chat.objects.filter(pk__in=Chat.objects.accessible_by(user).values('pk')).aaggregate(
+        chats=Count('id'),
+        last_message=Max('last_message_id'),
+        messages=Sum('message_count'),
+    )
+    # Los marcadores de lectura solo avanzan: su suma cambia con cada lectura
+    read = await ChatReadState.objects.filter(user=user).aaggregate(total=Sum('last_read_message_id'))
+    company_id = await Profile.objects.filter(user=user).values_list('company_id', flat=True).afirst()
+    return digest(
+        user.id, company_id,
+        summary['chats'], summary['last_message'], summary['messages'], read['total'],
+    )
+
+
+# Las vistas async pasan antes por login_required, que ya cargó la sesión:
+# has_pending_flash_messages no vuelve a consultarla.
+
+async def chat_messages_etag(request, chat_id):
+    """ETag del parcial de mensajes: último mensaje y total del chat, más el usuario y el cursor
+
+    Sin acceso al chat no hay ETag: la vista responde 403 y el valor delataría
+    la actividad del chat a quien no es miembro.
+    """
+    if has_pending_flash_messages(request):
+        return None
+    chat = await Chat.objects.filter(pk=chat_id).only('last_message_id', 'message_count').afirst()
+    if chat is None:
+        return None
+    user = await request.auser()
+    if not await chat.auser_can_access(user):
+        return None
+    return digest(
+        chat_id, chat.last_message_id, chat.message_count, user.id, request.GET.urlencode(), csrf_secret(request),
+    )
+
+
+async def chat_list_etag(request):
+    """ETag de la bandeja de chats"""
+    if has_pending_flash_messages(request):
+        return None
+    return digest(await ainbox_version(await request.auser()), csrf_secret(request))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+from messaging.models import Chat, Message
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen del último mensaje y el contador de mensajes de cada chat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Cantidad de chats actualizados por transacción')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        latest = Message.objects.filter(chat=OuterRef('pk')).order_by('-id')
+        counts = (
+            Message.objects.filter(chat=OuterRef('pk'))
+            .order_by()
+            .values('chat')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+
+        chat_ids = list(Chat.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(chat_ids), batch_size):
+            batch = chat_ids[start:start + batch_size]
+            with transaction.atomic():
+                Chat.objects.filter(pk__in=batch).update(
+                    last_message_id=Subquery(latest.values('id')[:1]),
+                    last_message_at=Subquery(latest.values('created_at')[:1]),
+                    last_message_preview=Coalesce(
+                        Subquery(latest.annotate(preview=Substr('content', 1, 120)).values('preview')[:1]),
+                        Value(''),
+                    ),
+                    message_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)),
+                )
+            self.stdout.write(f'{min(start + batch_size, len(chat_ids))}/{len(chat_ids)} chats actualizados')
+
+        self.stdout.write(self.style.SUCCESS('Resúmenes de chats recalculados.'))
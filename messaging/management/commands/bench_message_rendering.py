@@ -0,0 +1,72 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.utils import timezone
+from messaging.models import Message
+from messaging.rendering import BUBBLE_TEMPLATE, _bubble_key, render_messages
+
+# Lo que hacía message_list.html antes de la caché de burbujas
+UNCACHED_TEMPLATE = '{% for message in messages %}{% include "' + BUBBLE_TEMPLATE + '" %}{% endfor %}'
+
+
+class Command(BaseCommand):
+    help = ('Compara el tiempo de renderizar la lista de mensajes de un chat sin caché de burbujas, '
+            'con la caché vacía y con la caché llena, para chats de distintos tamaños')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help='Mensajes por chat, separados por comas')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por medición (se informa la mediana)')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        viewer, other = User(pk=1, username='lectora'), User(pk=2, username='remitente')
+        uncached = engines.all()[0].from_string(UNCACHED_TEMPLATE)
+        self.stdout.write(
+            f'Backend de caché: {caches["default"].__class__.__name__}, mediana de {options["repeat"]} repeticiones'
+        )
+
+        for size in [int(n) for n in options['sizes'].split(',')]:
+            messages = self.messages(size, viewer, other)
+            keys = [_bubble_key(message, viewer) for message in messages]
+            timings = {
+                'sin caché': self.measure(lambda: uncached.render({'messages': messages, 'user': viewer}), options),
+                'caché vacía': self.measure(lambda: render_messages(messages, viewer), options, evict=keys),
+                'caché llena': self.measure(lambda: render_messages(messages, viewer), options),
+            }
+            cache.delete_many(keys)
+            self.stdout.write(f'{size} mensajes')
+            baseline = timings['sin caché']
+            for label, elapsed in timings.items():
+                self.stdout.write(f'  {label:<12} {elapsed:8.1f} ms  (x{baseline / elapsed:.1f})')
+
+    def messages(self, size, viewer, other):
+        """Mensajes en memoria, sin tocar la base de datos"""
+        start = timezone.now() - timedelta(minutes=size)
+        # Ids lejos de los reales para no pisar burbujas cacheadas
+        first_id = random.randrange(10 ** 12, 10 ** 15)
+        return [
+            Message(
+                id=first_id + i,
+                sender=viewer if i % 3 == 0 else other,
+                content=f'Mensaje de prueba número {i} con algo de texto para la burbuja.',
+                created_at=start + timedelta(minutes=i),
+            )
+            for i in range(size)
+        ]
+
+    def measure(self, render, options, evict=()):
+        """Mediana en ms, tras una pasada de calentamiento; ``evict`` se borra antes de cada repetición"""
+        render()
+        timings = []
+        for _ in range(options['repeat']):
+            cache.delete_many(evict)
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,134 @@
+import asyncio
+import statistics
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from messaging.models import Chat
+
+
+class Command(BaseCommand):
+    help = ('Simula N clientes que hacen polling del chat cada pocos segundos contra un servidor '
+            'en marcha (p. ej. uvicorn o gunicorn) e informa cuántos atiende a tiempo')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='URL base del servidor, p. ej. http://127.0.0.1:8000')
+        parser.add_argument('--clients', default='50,100,200,400',
+                            help='Cantidades de clientes concurrentes a probar, separadas por comas')
+        parser.add_argument('--duration', type=float, default=20, help='Segundos por cada cantidad')
+        parser.add_argument('--interval', type=float, default=3, help='Segundos entre polls de cada cliente')
+        parser.add_argument('--username', help='Usuario de los clientes (por defecto, el primero con chats)')
+        parser.add_argument('--chat', type=int, help='Chat a consultar (por defecto, el primero accesible)')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Se necesita una URL http://host:puerto')
+
+        User = get_user_model()
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_active=True, chat_memberships__isnull=False).order_by('pk').first()
+        if user is None:
+            raise CommandError('No hay un usuario con chats para simular los clientes.')
+        chats = Chat.objects.accessible_by(user)
+        chat = chats.filter(pk=options['chat']).first() if options['chat'] else chats.order_by('pk').first()
+        if chat is None:
+            raise CommandError(f'{user.username} no tiene acceso a ningún chat.')
+        path = f'{reverse("messaging:chat_messages", args=[chat.pk])}?after={chat.last_message_id or 0}'
+
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        request = (
+            f'GET {path} HTTP/1.1\r\n'
+            f'Host: {url.netloc}\r\n'
+            f'Cookie: {settings.SESSION_COOKIE_NAME}={session.session_key}\r\n'
+            f'HX-Request: true\r\n'
+            f'\r\n'
+        ).encode()
+
+        self.stdout.write(f'GET {path} cada {options["interval"]:g} s, {options["duration"]:g} s por prueba')
+        try:
+            for clients in [int(n) for n in options['clients'].split(',')]:
+                results = asyncio.run(self.run(
+                    url.hostname, url.port or 80, request, clients, options['duration'], options['interval'],
+                ))
+                self.report(clients, results, options['interval'])
+        finally:
+            session.delete()
+
+    async def run(self, host, port, request, clients, duration, interval):
+        results = {'latencies': [], 'statuses': {}, 'errors': 0}
+        deadline = time.monotonic() + duration
+        # Arranques repartidos en un intervalo, como navegadores que abrieron el chat en momentos distintos
+        await asyncio.gather(*[
+            self.client(host, port, request, deadline, interval, interval * i / clients, results)
+            for i in range(clients)
+        ])
+        return results
+
+    async def client(self, host, port, request, deadline, interval, delay, results):
+        await asyncio.sleep(delay)
+        reader = writer = None
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                for reused in (writer is not None, False):
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(host, port)
+                    try:
+                        writer.write(request)
+                        status = await asyncio.wait_for(self.read_response(reader), timeout=interval)
+                        break
+                    except (ConnectionError, asyncio.IncompleteReadError):
+                        # El servidor cerró la conexión inactiva (keep-alive): reconectar como un navegador
+                        writer.close()
+                        reader = writer = None
+                        if not reused:
+                            raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                results['errors'] += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+            else:
+                results['latencies'].append(time.monotonic() - started)
+                results['statuses'][status] = results['statuses'].get(status, 0) + 1
+            await asyncio.sleep(max(0, interval - (time.monotonic() - started)))
+        if writer is not None:
+            writer.close()
+
+    async def read_response(self, reader):
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = dict(line.split(':', 1) for line in lines[1:] if ':' in line)
+        length = int({name.lower(): value for name, value in headers.items()}.get('content-length', 0))
+        if length:
+            await reader.readexactly(length)
+        return status
+
+    def report(self, clients, results, interval):
+        latencies = sorted(results['latencies'])
+        statuses = ', '.join(f'{status}: {count}' for status, count in sorted(results['statuses'].items()))
+        if latencies:
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+            timing = f'mediana {statistics.median(latencies) * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms'
+        else:
+            p95 = None
+            timing = 'sin respuestas'
+        failed = sum(count for status, count in results['statuses'].items() if status >= 500)
+        held = results['errors'] == failed == 0 and p95 is not None and p95 < interval
+        self.stdout.write(
+            f'{clients:>5} clientes: {len(latencies)} respuestas ({statuses}), '
+            f'{results["errors"]} errores o timeouts; {timing} -> '
+            + (self.style.SUCCESS('los atiende') if held else self.style.ERROR('no los atiende'))
+        )
@@ -0,0 +1,182 @@
+"""
+Mantenimiento incremental de ChatMembership.
+
+La tabla materializa quién accede a cada chat:
+
+* chats directos: sus participantes;
+* chats de empresa: los usuarios cuyo perfil pertenece a la empresa;
+* chats de cooperativa: los usuarios de las empresas miembro.
+
+Se actualiza con inserciones y borrados masivos cuando se crea un chat,
+cuando un perfil cambia de empresa y cuando cambian las empresas de una
+cooperativa. Cada cambio invalida la caché de acceso de los afectados.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from accounts.models import profile_company_changed
+from .access import invalidate_chat_access
+
+ORGANIZATION_ROLES = ('company', 'cooperative')
+
+
+def _apply(desired, existing):
+    """Sincronizar membresías: ``desired`` {(user_id, chat_id): role}, ``existing`` {(user_id, chat_id): pk}"""
+    from .models import ChatMembership, UserChatCount
+
+    to_create = [
+        ChatMembership(user_id=user_id, chat_id=chat_id, role=role)
+        for (user_id, chat_id), role in desired.items()
+        if (user_id, chat_id) not in existing
+    ]
+    to_delete = [pk for key, pk in existing.items() if key not in desired]
+    deltas = Counter(membership.user_id for membership in to_create)
+    deltas.subtract(user_id for (user_id, chat_id) in existing if (user_id, chat_id) not in desired)
+    with transaction.atomic():
+        if to_delete:
+            ChatMembership.objects.filter(pk__in=to_delete).delete()
+        if to_create:
+            ChatMembership.objects.bulk_create(to_create, batch_size=1000, ignore_conflicts=True)
+        UserChatCount.adjust(deltas)
+
+    changed_users = {user_id for user_id, _ in desired.keys() ^ existing.keys()}
+    # Al confirmar: antes, otro proceso podría recalcular el conjunto viejo y cachearlo con la versión nueva
+    transaction.on_commit(lambda: invalidate_chat_access(changed_users))
+
+
+def sync_chat_memberships(chat):
+    """Recalcular las membresías de un chat (al crearlo o tras cambios en sus participantes)"""
+    from accounts.models import Profile
+    from .models import ChatMembership
+
+    if chat.type == 'direct':
+        user_ids = chat.participants.values_list('pk', flat=True)
+        role = 'participant'
+    elif chat.type == 'company':
+        user_ids = Profile.objects.filter(company_id=chat.company_id).values_list('user_id', flat=True)
+        role = 'company'
+    else:
+        user_ids = (
+            Profile.objects.filter(company__cooperatives=chat.cooperative_id)
+            .values_list('user_id', flat=True).distinct()
+        )
+        role = 'cooperative'
+
+    desired = {(user_id, chat.pk): role for user_id in user_ids}
+    existing = {
+        (user_id, chat.pk): pk
+        for pk, user_id in ChatMembership.objects.filter(chat=chat).values_list('pk', 'user_id')
+    }
+    _apply(desired, existing)
+
+
+def refresh_user_memberships(user_ids):
+    """Recalcular las membresías de empresa y cooperativa de un grupo de usuarios"""
+    from accounts.models import Profile
+    from .models import Chat, ChatMembership
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    company_by_user = dict(
+        Profile.objects.filter(user_id__in=user_ids, company__isnull=False).values_list('user_id', 'company_id')
+    )
+    company_ids = set(company_by_user.values())
+
+    chats_by_company = {}
+    for chat_id, company_id in Chat.objects.filter(type='company', company_id__in=company_ids).values_list('pk', 'company_id'):
+        chats_by_company.setdefault(company_id, []).append((chat_id, 'company'))
+    cooperative_chats = Chat.objects.filter(
+        type='cooperative', cooperative__companies__in=company_ids
+    ).values_list('pk', 'cooperative__companies')
+    for chat_id, company_id in cooperative_chats:
+        chats_by_company.setdefault(company_id, []).append((chat_id, 'cooperative'))
+
+    desired = {
+        (user_id, chat_id): role
+        for user_id, company_id in company_by_user.items()
+        for chat_id, role in chats_by_company.get(company_id, ())
+    }
+    existing = {
+        (user_id, chat_id): pk
+        for pk, user_id, chat_id in ChatMembership.objects.filter(
+            user_id__in=user_ids, role__in=ORGANIZATION_ROLES
+        ).values_list('pk', 'user_id', 'chat_id')
+    }
+    _apply(desired, existing)
+
+
+def refresh_company_memberships(company_ids):
+    """Recalcular las membresías de todos los usuarios de las empresas indicadas"""
+    from accounts.models import Profile
+
+    refresh_user_memberships(
+        Profile.objects.filter(company_id__in=company_ids).values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_save, sender='messaging.Chat')
+def chat_created(sender, instance, created, **kwargs):
+    if created and instance.type in ORGANIZATION_ROLES:
+        sync_chat_memberships(instance)
+
+
+@receiver(pre_delete, sender='messaging.Chat')
+def chat_deleted(sender, instance, **kwargs):
+    """Las membresías se borran en cascada sin pasar por _apply: descontar el chat a sus miembros"""
+    from .models import UserChatCount
+
+    user_ids = list(instance.memberships.values_list('user_id', flat=True))
+    UserChatCount.adjust({user_id: -1 for user_id in user_ids})
+    transaction.on_commit(lambda: invalidate_chat_access(user_ids))
+
+
+@receiver(m2m_changed, sender='messaging.Chat_participants')
+def chat_participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Participantes de chats directos, desde el chat o desde el usuario (``user.chats.add(chat)``)"""
+    from .models import Chat
+
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear') and instance.type == 'direct':
+            sync_chat_memberships(instance)
+        return
+    if action == 'pre_clear':
+        # Tras el clear ya no se sabe en qué chats estaba
+        instance._cleared_chat_ids = list(instance.chats.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        chat_ids = instance._cleared_chat_ids if action == 'post_clear' else pk_set
+        for chat in Chat.objects.filter(pk__in=chat_ids, type='direct'):
+            sync_chat_memberships(chat)
+
+
+@receiver(profile_company_changed)
+def move_user_chats(sender, instance, **kwargs):
+    """company_join / company_leave: mover al usuario entre los chats de organización"""
+    refresh_user_memberships([instance.user_id])
+
+
+@receiver(m2m_changed, sender='organizations.Cooperative_companies')
+def cooperative_companies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Una empresa entró o salió de una cooperativa: recalcular a sus miembros"""
+    if action == 'pre_clear':
+        # Tras el clear ya no se sabe qué empresas había
+        instance._cleared_company_ids = (
+            [instance.pk] if reverse else list(instance.companies.values_list('pk', flat=True))
+        )
+    elif action == 'post_clear':
+        refresh_company_memberships(instance._cleared_company_ids)
+    elif action in ('post_add', 'post_remove'):
+        refresh_company_memberships([instance.pk] if reverse else pk_set)
+
+
+@receiver(pre_delete, sender='organizations.Company')
+def remember_company_members(sender, instance, **kwargs):
+    # Al eliminar la empresa los perfiles pasan a NULL sin señales
+    instance._member_user_ids = list(instance.members.values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender='organizations.Company')
+def company_deleted(sender, instance, **kwargs):
+    refresh_user_memberships(getattr(instance, '_member_user_ids', ()))
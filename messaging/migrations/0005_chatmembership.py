@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_memberships(apps, schema_editor):
+    """Materializar el acceso actual: participantes, miembros de empresa y de cooperativa"""
+    Chat = apps.get_model('messaging', 'Chat')
+    ChatMembership = apps.get_model('messaging', 'ChatMembership')
+    Profile = apps.get_model('accounts', 'Profile')
+
+    memberships = {}
+    for chat in Chat.objects.all():
+        if chat.type == 'direct':
+            user_ids = chat.participants.values_list('pk', flat=True)
+            role = 'participant'
+        elif chat.type == 'company':
+            user_ids = Profile.objects.filter(company_id=chat.company_id).values_list('user_id', flat=True)
+            role = 'company'
+        else:
+            user_ids = Profile.objects.filter(
+                company__cooperatives=chat.cooperative_id
+            ).values_list('user_id', flat=True)
+            role = 'cooperative'
+        for user_id in user_ids:
+            memberships[user_id, chat.pk] = role
+
+    ChatMembership.objects.bulk_create(
+        [ChatMembership(user_id=user_id, chat_id=chat_id, role=role) for (user_id, chat_id), role in memberships.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_chatreadstate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('participant', 'Participante'), ('company', 'Miembro de la empresa'), ('cooperative', 'Miembro de la cooperativa')], max_length=20)),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='messaging.chat')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Membresía de chat',
+                'verbose_name_plural': 'Membresías de chat',
+                'constraints': [models.UniqueConstraint(fields=('user', 'chat'), name='unique_chat_membership')],
+            },
+        ),
+        migrations.RunPython(backfill_memberships, migrations.RunPython.noop),
+    ]
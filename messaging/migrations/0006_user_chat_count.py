@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_chat_counts(apps, schema_editor):
+    ChatMembership = apps.get_model('messaging', 'ChatMembership')
+    UserChatCount = apps.get_model('messaging', 'UserChatCount')
+    counts = ChatMembership.objects.order_by().values('user_id').annotate(total=Count('id'))
+    UserChatCount.objects.bulk_create(
+        [UserChatCount(user_id=row['user_id'], value=row['total']) for row in counts.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('messaging', '0005_chatmembership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserChatCount',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='chat_count', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('value', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de chats',
+                'verbose_name_plural': 'Contadores de chats',
+            },
+        ),
+        migrations.RunPython(backfill_chat_counts, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,44 @@
-from django.db import models
+from functools import partial
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FilteredRelation, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
+from coopconnect.cache import cached, invalidate
 from organizations.models import Company, Cooperative
+from .access import aaccessible_chat_ids, accessible_chat_ids, ainvalidate_chat_access, invalidate_chat_access
+from .broker import get_broker
+
+
+class ChatQuerySet(models.QuerySet):
+    def accessible_by(self, user):
+        """Chats a los que el usuario tiene acceso (directos, de su empresa y de sus cooperativas)"""
+        return self.filter(memberships__user=user)
+
+    def unread_counts(self, user):
+        """Mensajes sin leer por chat ({chat_id: n}) en una sola consulta agrupada
+
+        Solo se cuentan los mensajes de otros usuarios posteriores al marcador
+        de lectura, y solo en chats cuyo último mensaje lo supera.
+        """
+        return {chat_id: unread for chat_id, unread in self._unread_rows(user) if unread}
+
+    async def aunread_counts(self, user):
+        """Versión async de ``unread_counts``"""
+        return {chat_id: unread async for chat_id, unread in self._unread_rows(user) if unread}
+
+    def _unread_rows(self, user):
+        return (
+            self.annotate(read_state=FilteredRelation('read_states', condition=Q(read_states__user=user)))
+            .annotate(last_read=Coalesce(F('read_state__last_read_message_id'), 0))
+            .filter(last_message_id__gt=F('last_read'))
+            .annotate(unread=Count(
+                'messages',
+                filter=Q(messages__id__gt=F('last_read')) & ~Q(messages__sender=user),
+            ))
+            .order_by()
+            .values_list('pk', 'unread')
+        )
 
 
 class Chat(models.Model):
@@ -16,6 +54,13 @@ class Chat(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True, related_name='chats')
     cooperative = models.ForeignKey(Cooperative, on_delete=models.CASCADE, null=True, blank=True, related_name='chats')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Resumen del último mensaje, mantenido por Message.save()
+    last_message_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=120, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+
+    objects = ChatQuerySet.as_manager()
 
     def __str__(self):
         if self.type == 'direct':
@@ -29,20 +74,139 @@ class Chat(models.Model):
         verbose_name = 'Chat'
         verbose_name_plural = 'Chats'
         ordering = ['-created_at']
+        indexes = [
+            # Búsqueda del chat de una empresa/cooperativa (create_*_chat, chat_list)
+            models.Index(fields=['company'], condition=Q(type='company'), name='chat_company_idx'),
+            models.Index(fields=['cooperative'], condition=Q(type='cooperative'), name='chat_cooperative_idx'),
+        ]
 
     def user_can_access(self, user):
-        """Verificar si un usuario puede acceder al chat"""
-        if self.type == 'direct':
-            return self.participants.filter(id=user.id).exists()
-        elif self.type == 'company':
-            # Acceso si el usuario pertenece a la empresa del chat
-            return hasattr(user, 'profile') and user.profile.company == self.company
-        elif self.type == 'cooperative':
-            # Acceso si la empresa del usuario pertenece a la cooperativa del chat
-            return (hasattr(user, 'profile') and 
-                    user.profile.company and 
-                    self.cooperative.companies.filter(id=user.profile.company.id).exists())
-        return False
+        """Verificar si un usuario puede acceder al chat
+
+        Se resuelve contra el conjunto cacheado de chats accesibles del
+        usuario; si el chat no está (p. ej. recién creado) se verifica en la
+        base de datos y, si hay acceso, se invalida el conjunto cacheado.
+        """
+        if self.id in accessible_chat_ids(user):
+            return True
+        can_access = self._user_can_access_uncached(user)
+        if can_access:
+            invalidate_chat_access([user.id])
+        return can_access
+
+    def _user_can_access_uncached(self, user):
+        return self.memberships.filter(user=user).exists()
+
+    async def auser_can_access(self, user):
+        """Versión async de ``user_can_access`` (vistas async bajo ASGI)"""
+        if self.id in await aaccessible_chat_ids(user):
+            return True
+        can_access = await self.memberships.filter(user=user).aexists()
+        if can_access:
+            await ainvalidate_chat_access([user.id])
+        return can_access
+
+    def history_page(self, before_id=None, limit=50):
+        """Página de historial por keyset (created_at, id).
+
+        Devuelve los ``limit`` mensajes más recientes anteriores al mensaje
+        ``before_id`` (o los más recientes del chat) en orden cronológico,
+        junto con un booleano que indica si quedan mensajes más antiguos.
+        """
+        page = list(self._history_queryset(before_id)[:limit + 1])
+        return page[:limit][::-1], len(page) > limit
+
+    async def ahistory_page(self, before_id=None, limit=50):
+        """Versión async de ``history_page``"""
+        page = [message async for message in self._history_queryset(before_id)[:limit + 1]]
+        return page[:limit][::-1], len(page) > limit
+
+    def _history_queryset(self, before_id):
+        queryset = self.messages.select_related('sender').order_by('-created_at', '-id')
+        if before_id is not None:
+            cursor = self.messages.filter(id=before_id).values('created_at')[:1]
+            # created_at <= cursor es redundante, pero da al índice (chat, created_at, id)
+            # un rango; el OR solo no lo aprovecha
+            queryset = queryset.filter(created_at__lte=Subquery(cursor)).filter(
+                Q(created_at__lt=Subquery(cursor)) | Q(id__lt=before_id)
+            )
+        return queryset
+
+
+class ChatMembership(models.Model):
+    """Acceso materializado de un usuario a un chat
+
+    Se mantiene desde messaging.membership: participantes de los chats
+    directos, miembros de la empresa y miembros de las empresas de la
+    cooperativa.
+    """
+    ROLE_CHOICES = [
+        ('participant', 'Participante'),
+        ('company', 'Miembro de la empresa'),
+        ('cooperative', 'Miembro de la cooperativa'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_memberships')
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='memberships')
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username} en {self.chat_id} ({self.role})"
+
+    class Meta:
+        verbose_name = 'Membresía de chat'
+        verbose_name_plural = 'Membresías de chat'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chat'], name='unique_chat_membership'),
+        ]
+
+
+class UserChatCount(models.Model):
+    """Cantidad de chats accesibles por usuario (evita contar ChatMembership)
+
+    Se ajusta en la misma transacción que las membresías (ver
+    messaging.membership) y se lee a través de una caché de vida corta.
+    """
+    CACHE_TIMEOUT = 60
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='chat_count')
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.value}"
+
+    class Meta:
+        verbose_name = 'Contador de chats'
+        verbose_name_plural = 'Contadores de chats'
+
+    @staticmethod
+    def cache_key(user_id):
+        return f'user-chat-count:{user_id}'
+
+    @classmethod
+    def for_user(cls, user):
+        """Chats del usuario, desde la caché o con una consulta por clave primaria"""
+        return cached(
+            cls.cache_key(user.id),
+            lambda: cls.objects.filter(pk=user.id).values_list('value', flat=True).first() or 0,
+            cls.CACHE_TIMEOUT,
+        )
+
+    @classmethod
+    def adjust(cls, deltas):
+        """Sumar ``deltas`` {user_id: +n/-n} con un UPDATE por cada valor distinto"""
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in deltas], ignore_conflicts=True)
+        by_delta = {}
+        for user_id, delta in deltas.items():
+            by_delta.setdefault(delta, []).append(user_id)
+        for delta, user_ids in by_delta.items():
+            cls.objects.filter(pk__in=user_ids).update(value=F('value') + delta)
+        keys = [cls.cache_key(user_id) for user_id in deltas]
+        transaction.on_commit(lambda: invalidate(*keys))
 
 
 class Message(models.Model):
@@ -55,8 +219,92 @@ class Message(models.Model):
     def __str__(self):
         return f"{self.sender.username}: {self.content[:30]}"
 
+    def save(self, *args, **kwargs):
+        """Guardar el mensaje y actualizar el resumen del chat en la misma transacción"""
+        is_new = self._state.adding
+        with transaction.atomic():
+            if is_new:
+                # Bloquear la fila del chat antes de tomar el id: las inserciones
+                # de un chat se confirman en orden de id y el polling con
+                # ?after=<id> no puede saltarse un mensaje que se confirme tarde
+                Chat.objects.select_for_update().filter(pk=self.chat_id).exists()
+            super().save(*args, **kwargs)
+            if is_new:
+                self._update_chat_summary()
+                # Avisar a los streams SSE abiertos cuando el mensaje sea visible
+                transaction.on_commit(partial(get_broker().publish, self.chat_id, self.id))
+
+    def _update_chat_summary(self):
+        # Solo se reemplaza el resumen si este mensaje es más nuevo que el
+        # registrado, de modo que inserciones concurrentes no lo retrocedan
+        newer = Q(last_message_id__isnull=True) | Q(last_message_id__lt=self.id)
+        Chat.objects.filter(pk=self.chat_id).update(
+            message_count=F('message_count') + 1,
+            last_message_id=Case(
+                When(newer, then=Value(self.id)),
+                default=F('last_message_id'),
+                output_field=models.BigIntegerField(),
+            ),
+            last_message_at=Case(
+                When(newer, then=Value(self.created_at)),
+                default=F('last_message_at'),
+                output_field=models.DateTimeField(),
+            ),
+            last_message_preview=Case(
+                When(newer, then=Value(self.content[:120])),
+                default=F('last_message_preview'),
+                output_field=models.CharField(),
+            ),
+        )
+
     class Meta:
         verbose_name = 'Mensaje'
         verbose_name_plural = 'Mensajes'
         ordering = ['created_at']
+        indexes = [
+            # Historial por chat ordenado y paginado por (created_at, id)
+            models.Index(fields=['chat', 'created_at', 'id'], name='message_chat_created_idx'),
+        ]
+
+
+class ChatReadState(models.Model):
+    """Último mensaje leído por un usuario en un chat"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_states')
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='read_states')
+    last_read_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} leyó {self.chat_id} hasta {self.last_read_message_id}"
+
+    class Meta:
+        verbose_name = 'Estado de lectura'
+        verbose_name_plural = 'Estados de lectura'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'chat'], name='unique_chat_read_state'),
+        ]
+
+    @classmethod
+    def mark_read(cls, user, chat_id, message_id):
+        """Avanzar el marcador de lectura hasta ``message_id`` (nunca retrocede)"""
+        updated = cls.objects.filter(
+            user=user, chat_id=chat_id, last_read_message_id__lt=message_id
+        ).update(last_read_message_id=message_id, updated_at=timezone.now())
+        if not updated:
+            # Primera lectura del chat; si la fila ya existía no se toca
+            cls.objects.bulk_create(
+                [cls(user=user, chat_id=chat_id, last_read_message_id=message_id)],
+                ignore_conflicts=True,
+            )
 
+    @classmethod
+    async def amark_read(cls, user, chat_id, message_id):
+        """Versión async de ``mark_read``"""
+        updated = await cls.objects.filter(
+            user=user, chat_id=chat_id, last_read_message_id__lt=message_id
+        ).aupdate(last_read_message_id=message_id, updated_at=timezone.now())
+        if not updated:
+            await cls.objects.abulk_create(
+                [cls(user=user, chat_id=chat_id, last_read_message_id=message_id)],
+                ignore_conflicts=True,
+            )
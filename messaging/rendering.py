@@ -0,0 +1,61 @@
+"""
+Renderizado de burbujas de mensaje con caché de fragmentos.
+
+Los mensajes no cambian tras crearse, así que el HTML de cada burbuja se
+cachea por id de mensaje y por variante ("mine" para el remitente,
+"theirs" para el resto). Cada respuesta solo renderiza los mensajes que
+nadie ha visto todavía.
+
+Lo que sí puede cambiar es el remitente: la variante "theirs" muestra su
+nombre de usuario, que por eso forma parte de la clave. Si se renombra, sus
+burbujas se renderizan de nuevo y las viejas vencen solas.
+"""
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+from coopconnect.timing import record_cache
+
+BUBBLE_TEMPLATE = 'messaging/partials/message.html'
+BUBBLE_CACHE_TIMEOUT = 60 * 60 * 24
+# Incrementar al modificar la plantilla de la burbuja
+BUBBLE_CACHE_VERSION = 1
+
+
+def _bubble_key(message, user):
+    """Clave de la burbuja; ``message.sender`` debe venir con select_related"""
+    if message.sender_id == user.id:
+        return f'message-bubble:{BUBBLE_CACHE_VERSION}:{message.id}:mine'
+    return f'message-bubble:{BUBBLE_CACHE_VERSION}:{message.id}:theirs:{message.sender.username}'
+
+
+def _render(messages, user, keys, cached):
+    """(HTML, burbujas nuevas a cachear) a partir de las ya cacheadas"""
+    template = None
+    rendered = {}
+    parts = []
+    for message, key in zip(messages, keys):
+        html = cached.get(key)
+        if html is None:
+            template = template or get_template(BUBBLE_TEMPLATE)
+            html = rendered[key] = template.render({'message': message, 'user': user})
+        parts.append(html)
+    record_cache(hits=len(parts) - len(rendered), misses=len(rendered))
+    return mark_safe(''.join(parts)), rendered
+
+
+def render_messages(messages, user):
+    """HTML concatenado de las burbujas de ``messages`` vistas por ``user``"""
+    keys = [_bubble_key(message, user) for message in messages]
+    html, rendered = _render(messages, user, keys, cache.get_many(keys))
+    if rendered:
+        cache.set_many(rendered, BUBBLE_CACHE_TIMEOUT)
+    return html
+
+
+async def arender_messages(messages, user):
+    """Versión async de ``render_messages`` (la plantilla no consulta la base de datos)"""
+    keys = [_bubble_key(message, user) for message in messages]
+    html, rendered = _render(messages, user, keys, await cache.aget_many(keys))
+    if rendered:
+        await cache.aset_many(rendered, BUBBLE_CACHE_TIMEOUT)
+    return html
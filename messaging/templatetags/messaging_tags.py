@@ -0,0 +1,10 @@
+from django import template
+from messaging.rendering import render_messages
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def message_bubbles(context, chat_messages):
+    """Burbujas de los mensajes para el usuario del contexto (con caché por mensaje)"""
+    return render_messages(chat_messages, context['user'])
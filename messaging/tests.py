@@ -0,0 +1,466 @@
+import asyncio
+import re
+import threading
+import time
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from coopconnect.cache import scope_version
+from coopconnect.testing import Post, QueryBudgetSuite, htmx_elements
+from organizations.models import Company
+from .broker import InProcessBroker, PostgresBroker
+from .models import Chat, ChatMembership, ChatReadState, Message, UserChatCount
+from .rendering import render_messages
+from .views import MESSAGES_PAGE_SIZE
+
+
+class ChatListETagTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='x')
+        self.client.force_login(self.user)
+
+    def test_new_csrf_cookie_changes_etag(self):
+        url = reverse('messaging:chat_list')
+        self.client.cookies['csrftoken'] = 'a' * 32
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.cookies['csrftoken'] = 'b' * 32
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ChatMessagesETagTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('ana', password='x')
+        self.outsider = User.objects.create_user('eva', password='x')
+        self.chat = Chat.objects.create(type='direct')
+        self.chat.participants.add(self.member)
+        Message.objects.create(chat=self.chat, sender=self.member, content='Hola')
+        self.url = reverse('messaging:chat_messages', args=[self.chat.pk])
+
+    def test_member_gets_etag(self):
+        self.client.force_login(self.member)
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_non_member_gets_403_without_etag(self):
+        self.client.force_login(self.member)
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(self.outsider)
+        for headers in ({}, {'HTTP_IF_NONE_MATCH': etag}, {'HTTP_IF_NONE_MATCH': '*'}):
+            response = self.client.get(self.url, **headers)
+            self.assertEqual(response.status_code, 403)
+            self.assertNotIn('ETag', response)
+
+
+class ChatPollingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='x')
+        self.client.force_login(self.user)
+        self.chat = Chat.objects.create(type='direct')
+        self.chat.participants.add(self.user)
+        for i in range(MESSAGES_PAGE_SIZE + 10):
+            Message.objects.create(chat=self.chat, sender=self.user, content=f'Mensaje {i}')
+        self.url = reverse('messaging:chat_messages', args=[self.chat.pk])
+
+    def message_ids(self, response):
+        return [int(message_id) for message_id in re.findall(r'data-message-id="(\d+)"', response.content.decode())]
+
+    def test_after_returns_one_page_and_next_poll_the_rest(self):
+        ids = list(self.chat.messages.order_by('id').values_list('id', flat=True))
+        first = self.message_ids(self.client.get(self.url, {'after': 0}))
+        self.assertEqual(first, ids[:MESSAGES_PAGE_SIZE])
+        rest = self.message_ids(self.client.get(self.url, {'after': first[-1]}))
+        self.assertEqual(rest, ids[MESSAGES_PAGE_SIZE:])
+        self.assertEqual(self.client.get(self.url, {'after': rest[-1]}).status_code, 204)
+
+    def test_bubbles_carry_the_ids_read_by_the_page_script(self):
+        # lastMessageId() lee data-message-id; el SSE descarta burbujas con un id ya presente
+        html = self.client.get(self.url, {'after': 0}).content.decode()
+        bubbles = re.findall(r'id="message-(\d+)" data-message-id="(\d+)"', html)
+        self.assertEqual(len(bubbles), MESSAGES_PAGE_SIZE)
+        self.assertTrue(all(element_id == message_id for element_id, message_id in bubbles))
+
+    def test_older_page_starts_with_the_next_sentinel(self):
+        ids = list(self.chat.messages.order_by('id').values_list('id', flat=True))
+        url = reverse('messaging:chat_messages_older', args=[self.chat.pk])
+        html = self.client.get(url, {'before': ids[-1]}).content.decode()
+        [sentinel] = htmx_elements(html)
+        # Sin hx-target: el sentinel se reemplaza a sí mismo, y el script que
+        # conserva el scroll lo reconoce por su id
+        self.assertEqual(sentinel.attrs['id'], 'loadOlder')
+        self.assertNotIn('hx-target', sentinel.attrs)
+        self.assertEqual(sentinel.attrs['hx-swap'], 'outerHTML')
+        self.assertEqual(sentinel.attrs['hx-trigger'], 'intersect once, click')
+        self.assertLess(html.index('id="loadOlder"'), html.index('data-message-id'))
+        oldest = self.message_ids(self.client.get(url, {'before': ids[-1]}))[0]
+        self.assertTrue(sentinel.attrs['hx-get'].endswith(f'?before={oldest}'))
+
+        last_page = self.client.get(sentinel.attrs['hx-get']).content.decode()
+        self.assertEqual(htmx_elements(last_page), [])
+
+
+class UnreadCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana')
+        self.other = User.objects.create_user('bea')
+        self.client.force_login(self.user)
+        self.chats = [Chat.objects.create(type='direct') for _ in range(3)]
+        for chat in self.chats:
+            chat.participants.add(self.user, self.other)
+        for i, chat in enumerate(self.chats):
+            for n in range(i + 1):
+                Message.objects.create(chat=chat, sender=self.other, content=f'Hola {n}')
+            # Los mensajes propios no cuentan como no leídos
+            Message.objects.create(chat=chat, sender=self.user, content='Yo')
+
+    def unread(self):
+        return self.client.get(reverse('messaging:unread_counts')).json()
+
+    def test_counts_every_chat_in_one_grouped_query(self):
+        with self.assertNumQueries(1):
+            counts = Chat.objects.filter(pk__in=[chat.pk for chat in self.chats]).unread_counts(self.user)
+        self.assertEqual(counts, {chat.pk: i + 1 for i, chat in enumerate(self.chats)})
+        self.assertEqual(self.unread()['total'], 6)
+
+    def test_read_marker_never_moves_back(self):
+        last = self.chats[2].messages.order_by('id').last().pk
+        ChatReadState.mark_read(self.user, self.chats[2].pk, last)
+        ChatReadState.mark_read(self.user, self.chats[2].pk, last - 2)
+        self.assertEqual(ChatReadState.objects.get(user=self.user, chat=self.chats[2]).last_read_message_id, last)
+        self.assertNotIn(str(self.chats[2].pk), self.unread()['chats'])
+
+    def test_opening_chat_marks_it_read(self):
+        self.client.get(reverse('messaging:chat_detail', args=[self.chats[1].pk]))
+        self.assertEqual(self.unread(), {'total': 4, 'chats': {str(self.chats[0].pk): 1, str(self.chats[2].pk): 3}})
+
+    def test_poll_marks_new_messages_read(self):
+        chat = self.chats[0]
+        self.client.get(reverse('messaging:chat_detail', args=[chat.pk]))
+        Message.objects.create(chat=chat, sender=self.other, content='Nuevo')
+        self.assertEqual(self.unread()['chats'][str(chat.pk)], 1)
+        after = ChatReadState.objects.get(user=self.user, chat=chat).last_read_message_id
+        self.client.get(reverse('messaging:chat_messages', args=[chat.pk]), {'after': after})
+        self.assertNotIn(str(chat.pk), self.unread()['chats'])
+
+
+class ChatAccessInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana', password='x')
+        self.company = Company.objects.create(name='Acme', sector='tecnologia', description='x')
+        self.chat = Chat.objects.create(type='company', company=self.company)
+
+    def test_access_invalidated_only_after_commit(self):
+        scope = f'chat-access:{self.user.pk}'
+        version = scope_version(scope)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            profile = self.user.profile
+            profile.company = self.company
+            profile.save()
+            # Todavía en la transacción: un lector concurrente no debe cachear
+            # el conjunto viejo con una versión nueva
+            self.assertEqual(scope_version(scope), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(scope_version(scope), version)
+        self.assertTrue(self.chat.user_can_access(self.user))
+
+
+class DirectChatParticipantsTests(TestCase):
+    """Las membresías siguen a los participantes, se cambien desde el chat o desde el usuario"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana')
+        self.chats = [Chat.objects.create(type='direct') for _ in range(2)]
+
+    def change(self, update, *args):
+        # El recuento cacheado se invalida al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            update(*args)
+
+    def assertMember(self, *chats):
+        self.assertEqual(
+            set(ChatMembership.objects.filter(user=self.user).values_list('chat_id', flat=True)),
+            {chat.pk for chat in chats},
+        )
+        self.assertEqual(UserChatCount.for_user(self.user), len(chats))
+        for chat in self.chats:
+            self.assertEqual(chat.user_can_access(self.user), chat in chats)
+
+    def test_forward_changes(self):
+        self.change(self.chats[0].participants.add, self.user)
+        self.assertMember(self.chats[0])
+        self.change(self.chats[0].participants.remove, self.user)
+        self.assertMember()
+
+    def test_reverse_add_and_remove(self):
+        self.change(self.user.chats.add, *self.chats)
+        self.assertMember(*self.chats)
+        self.change(self.user.chats.remove, self.chats[0])
+        self.assertMember(self.chats[1])
+
+    def test_reverse_clear(self):
+        self.change(self.user.chats.add, *self.chats)
+        self.change(self.user.chats.clear)
+        self.assertMember()
+
+
+class BubbleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender = User.objects.create_user('ana')
+        self.reader = User.objects.create_user('luis')
+        self.chat = Chat.objects.create(type='direct')
+        self.chat.participants.add(self.sender, self.reader)
+        Message.objects.create(chat=self.chat, sender=self.sender, content='Hola')
+
+    def render(self):
+        return render_messages(list(self.chat.messages.select_related('sender')), self.reader)
+
+    def test_cached_bubble_is_reused(self):
+        html = self.render()
+        with mock.patch('messaging.rendering.get_template') as get_template:
+            self.assertEqual(self.render(), html)
+        get_template.assert_not_called()
+
+    def test_renamed_sender_shows_new_name(self):
+        self.assertIn('ana', self.render())
+        self.sender.username = 'ana.maria'
+        self.sender.save()
+        self.assertIn('ana.maria', self.render())
+
+
+class ChatAccessExpiryTests(TestCase):
+    """Con una caché por proceso, el acceso revocado en otro proceso vence en segundos"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana', password='x')
+        self.chat = Chat.objects.create(type='direct')
+        self.chat.participants.add(self.user)
+
+    def test_default_timeout_is_short_without_shared_cache(self):
+        self.assertFalse(settings.CACHE_SHARED)
+        self.assertLessEqual(settings.CHAT_ACCESS_CACHE_SECONDS, 10)
+
+    def test_revocation_takes_effect_after_timeout(self):
+        self.assertTrue(self.chat.user_can_access(self.user))
+        # La invalidación ocurre en otro proceso: esta caché no se entera
+        with mock.patch('messaging.membership.invalidate_chat_access'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.chat.participants.remove(self.user)
+        self.assertTrue(self.chat.user_can_access(self.user))
+        later = time.time() + settings.CHAT_ACCESS_CACHE_SECONDS + 1
+        with mock.patch('coopconnect.cache.time.time', return_value=later):
+            self.assertFalse(self.chat.user_can_access(self.user))
+
+
+class InProcessBrokerTests(SimpleTestCase):
+    async def test_publish_reaches_only_subscribers_of_the_chat(self):
+        broker = InProcessBroker()
+        subscription, other = broker.subscribe(1), broker.subscribe(2)
+        broker.publish(1, 10)
+        self.assertEqual(await subscription.wait(1), 10)
+        self.assertIsNone(await other.wait(0.01))
+
+    async def test_closed_subscription_is_not_notified(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(1)
+        subscription.close()
+        broker.publish(1, 10)
+        self.assertIsNone(await subscription.wait(0.01))
+        self.assertEqual(broker._subscriptions, {})
+
+
+class StopListening(Exception):
+    pass
+
+
+@skipUnless(connection.vendor == 'postgresql', 'LISTEN/NOTIFY de PostgreSQL')
+class PostgresBrokerTests(TransactionTestCase):
+    async def test_notify_reaches_subscribers(self):
+        broker = PostgresBroker()
+        listening = threading.Event()
+        read_notifies = broker._read_notifies
+        deadline = time.monotonic() + 10
+
+        def read_until_first_notify(raw, timeout=5):
+            # Tras el primer aviso (o el plazo) el listener termina, en vez de escuchar para siempre
+            listening.set()
+            for payload in read_notifies(raw, timeout=0.1):
+                yield payload
+                raise StopListening
+            if time.monotonic() > deadline:
+                raise StopListening
+
+        def listen():
+            try:
+                broker._listen()
+            except StopListening:
+                pass
+
+        with mock.patch.object(broker, '_ensure_listener'), \
+                mock.patch.object(broker, '_read_notifies', read_until_first_notify):
+            subscription = broker.subscribe(7)
+            listener = threading.Thread(target=listen)
+            listener.start()
+            try:
+                await asyncio.to_thread(listening.wait, 5)
+                await sync_to_async(broker.publish)(7, 42)
+                self.assertEqual(await subscription.wait(5), 42)
+            finally:
+                await asyncio.to_thread(listener.join)
+                subscription.close()
+
+
+class ChatStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana')
+        self.chat = Chat.objects.create(type='direct')
+        self.chat.participants.add(self.user)
+
+    async def open_stream(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('messaging:chat_stream', args=[self.chat.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b'retry:'))
+        return events
+
+    def revoke_access(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chat.participants.remove(self.user)
+
+    @mock.patch('messaging.views.SSE_HEARTBEAT_SECONDS', 0.01)
+    async def test_new_message_is_streamed(self):
+        events = await self.open_stream()
+        message = await Message.objects.acreate(chat=self.chat, sender=self.user, content='Hola')
+        event = await anext(events)
+        while event == b': heartbeat\n\n':
+            event = await anext(events)
+        self.assertTrue(event.startswith(f'id: {message.pk}\n'.encode()), event)
+        self.assertIn(b'Hola', event)
+        # La página descarta la burbuja si ya la trajo el polling
+        self.assertIn(f'id="message-{message.pk}" data-message-id="{message.pk}"'.encode(), event)
+        await events.aclose()
+
+    @mock.patch('messaging.views.SSE_HEARTBEAT_SECONDS', 0.01)
+    async def test_stream_ends_when_access_is_revoked(self):
+        events = await self.open_stream()
+        self.assertEqual(await anext(events), b': heartbeat\n\n')
+        await sync_to_async(self.revoke_access)()
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+
+    async def test_non_member_is_forbidden(self):
+        await sync_to_async(self.revoke_access)()
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('messaging:chat_stream', args=[self.chat.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class QueryBudgetTests(QueryBudgetSuite, TestCase):
+    routes = ('messaging:',)
+    opt_out = {
+        'messaging:chat_stream': 'SSE solo bajo ASGI: con el cliente de pruebas responde 204 sin consultas '
+                                 '(el stream se prueba en ChatStreamTests)',
+    }
+
+    def budgets(self):
+        chat_id = self.data.company_chat.pk
+        # Sin chat directo con el usuario: la vista lo crea
+        stranger = User.objects.create_user(f'nuevo{self.data.rows}')
+        return {
+            reverse('messaging:chat_list'): 9,
+            reverse('messaging:unread_counts'): 3,
+            reverse('messaging:chat_detail', args=[chat_id]): 9,
+            Post(reverse('messaging:send_message', args=[chat_id]), {'content': 'Hola'}): 9,
+            f'{reverse("messaging:chat_messages", args=[chat_id])}?after={self.data.first_message.pk}': 8,
+            f'{reverse("messaging:chat_messages_older", args=[chat_id])}?before={self.data.first_message.pk + 2}': 6,
+            reverse('messaging:create_direct_chat', args=[stranger.pk]): 14,
+            reverse('messaging:create_company_chat', args=[self.data.company.pk]): 6,
+            reverse('messaging:create_cooperative_chat', args=[self.data.cooperative.pk]): 7,
+        }
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN de PostgreSQL')
+class HistoryIndexTests(TestCase):
+    """El historial paginado por (created_at, id) usa message_chat_created_idx"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('ana')
+        chats = Chat.objects.bulk_create([Chat(type='direct') for _ in range(5)])
+        Message.objects.bulk_create(
+            Message(chat=chat, sender=user, content=f'Mensaje {i}') for chat in chats for i in range(5000)
+        )
+        cls.chat = chats[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE messaging_message')
+
+    def assertUsesHistoryIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertIn('message_chat_created_idx', plan, plan)
+
+    def test_latest_page(self):
+        self.assertUsesHistoryIndex(self.chat._history_queryset(None)[:51])
+
+    def test_older_page(self):
+        before_id = self.chat.messages.order_by('id').values_list('id', flat=True)[100]
+        queryset = self.chat._history_queryset(before_id)[:51]
+        self.assertUsesHistoryIndex(queryset)
+        # Un rango sobre created_at, no un filtro sobre todos los mensajes más nuevos
+        self.assertRegex(queryset.explain(), r'Index Cond: \(\(chat_id = \d+\) AND \(created_at <=')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Bloqueos de fila de PostgreSQL')
+class MessageCommitOrderTests(TransactionTestCase):
+    """Un mensaje con id mayor no se confirma antes que uno menor del mismo chat"""
+
+    def test_concurrent_insert_waits_for_earlier_one(self):
+        user = User.objects.create_user('ana')
+        chat = Chat.objects.create(type='direct')
+        first_inserted = threading.Event()
+        saw_first = []
+        update_chat_summary = Message._update_chat_summary
+
+        def slow_update_chat_summary(message):
+            # El primer mensaje ya tiene id pero su transacción sigue abierta
+            if message.content == 'primero':
+                first_inserted.set()
+                time.sleep(0.5)
+            update_chat_summary(message)
+
+        def first():
+            try:
+                Message.objects.create(chat=chat, sender=user, content='primero')
+            finally:
+                connection.close()
+
+        def second():
+            try:
+                first_inserted.wait()
+                Message.objects.create(chat=chat, sender=user, content='segundo')
+                saw_first.append(Message.objects.filter(content='primero').exists())
+            finally:
+                connection.close()
+
+        with mock.patch.object(Message, '_update_chat_summary', slow_update_chat_summary):
+            threads = [threading.Thread(target=first), threading.Thread(target=second)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        # Si el segundo se confirmara antes, un poll con ?after=<segundo> nunca vería el primero
+        self.assertEqual(saw_first, [True])
+        self.assertEqual(
+            list(chat.messages.order_by('id').values_list('content', flat=True)), ['primero', 'segundo'],
+        )
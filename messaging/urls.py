@@ -5,8 +5,12 @@ app_name = 'messaging'
 
 urlpatterns = [
     path('', views.chat_list, name='chat_list'),
+    path('unread/', views.unread_counts, name='unread_counts'),
     path('chat/<int:chat_id>/', views.chat_detail, name='chat_detail'),
+    path('chat/<int:chat_id>/send/', views.send_message, name='send_message'),
     path('chat/<int:chat_id>/messages/', views.chat_messages, name='chat_messages'),
+    path('chat/<int:chat_id>/messages/older/', views.chat_messages_older, name='chat_messages_older'),
+    path('chat/<int:chat_id>/stream/', views.chat_stream, name='chat_stream'),
     path('direct/<int:user_id>/', views.create_direct_chat, name='create_direct_chat'),
     path('company/<int:company_id>/', views.create_company_chat, name='create_company_chat'),
     path('cooperative/<int:cooperative_id>/', views.create_cooperative_chat, name='create_cooperative_chat'),
@@ -1,39 +1,55 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.db.models import Q, Max
-from django.http import HttpResponseForbidden
-from .models import Chat, Message
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse,
+)
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST
+from coopconnect.replica import pin_to_primary, read_from_replica
+from .broker import get_broker
+from .etags import async_condition, chat_list_etag, chat_messages_etag
+from .models import Chat, ChatReadState, Message
+from .rendering import arender_messages
 from .forms import MessageForm
 from organizations.models import Company, Cooperative
 
+# Cantidad de mensajes por página de historial
+MESSAGES_PAGE_SIZE = 50
+
+# Stream SSE: segundos entre heartbeats y espera sugerida al reconectar (ms)
+SSE_HEARTBEAT_SECONDS = 15
+SSE_RETRY_MS = 3000
 
 @login_required
-def chat_list(request):
+@read_from_replica
+@cache_control(private=True, no_cache=True)
+@async_condition(chat_list_etag)
+async def chat_list(request):
     """Lista todos los chats del usuario"""
+    user = await request.auser()
     # Obtener chats donde el usuario tiene acceso dinámico
-    user_company = getattr(request.user.profile, 'company', None)
-    
-    # 1. Chats directos (donde es participante)
-    direct_chats = Q(type='direct', participants=request.user)
-    
-    # 2. Chats de su empresa
-    company_chats = Q(type='company', company=user_company) if user_company else Q(pk__in=[])
-    
-    # 3. Chats de cooperativas donde su empresa es miembro
-    cooperative_chats = Q(type='cooperative', cooperative__companies=user_company) if user_company else Q(pk__in=[])
-    
-    chats = Chat.objects.filter(
-        direct_chats | company_chats | cooperative_chats
-    ).distinct().annotate(
-        last_message_time=Max('messages__created_at')
-    ).order_by('-last_message_time')
+    chats = [
+        chat async for chat in Chat.objects.accessible_by(user)
+        .select_related('company', 'cooperative')
+        .prefetch_related('participants')
+        .order_by(F('last_message_at').desc(nulls_last=True), '-created_at')
+    ]
+
+    # Contadores de no leídos de toda la bandeja en una sola consulta
+    unread = await Chat.objects.filter(pk__in=[chat.pk for chat in chats]).aunread_counts(user)
+    for chat in chats:
+        chat.unread_count = unread.get(chat.pk, 0)
     
     context = {
         'chats': chats
     }
-    return render(request, 'messaging/chat_list.html', context)
+    # La plantilla base consulta request.user y los mensajes flash: se renderiza en un hilo
+    return await sync_to_async(render)(request, 'messaging/chat_list.html', context)
 
 
 @login_required
@@ -46,40 +62,207 @@ def chat_detail(request, chat_id):
         messages.error(request, 'No tienes acceso a este chat.')
         return redirect('messaging:chat_list')
     
-    # Obtener todos los mensajes del chat
-    chat_messages = chat.messages.all().order_by('created_at')
-    
-    # Procesar formulario de envío de mensaje
-    if request.method == 'POST':
-        form = MessageForm(request.POST)
-        if form.is_valid():
-            message = form.save(commit=False)
-            message.chat = chat
-            message.sender = request.user
-            message.save()
-            messages.success(request, 'Mensaje enviado.')
-            return redirect('messaging:chat_detail', chat_id=chat.id)
-    else:
-        form = MessageForm()
+    # Obtener solo la página más reciente; el historial se carga al hacer scroll
+    chat_messages, has_older = chat.history_page(limit=MESSAGES_PAGE_SIZE)
+    if chat_messages:
+        ChatReadState.mark_read(request.user, chat.id, chat_messages[-1].id)
     
+    # El formulario se envía a send_message
     context = {
         'chat': chat,
         'chat_messages': chat_messages,
-        'form': form
+        'has_older': has_older,
+        'form': MessageForm()
     }
     return render(request, 'messaging/chat_detail.html', context)
 
 
 @login_required
-def chat_messages(request, chat_id):
-    """Vista parcial para obtener mensajes (HTMX polling)"""
-    chat = get_object_or_404(Chat, id=chat_id)
+@require_POST
+async def send_message(request, chat_id):
+    """Enviar un mensaje al chat
+
+    Con HTMX responde 204 y dispara el evento ``messageSent``, que hace que
+    el polling traiga el mensaje nuevo; sin HTMX redirige al chat.
+    """
+    user = await request.auser()
+    chat = await aget_object_or_404(Chat, id=chat_id)
+    is_htmx = request.headers.get('HX-Request') == 'true'
+
+    if not await chat.auser_can_access(user):
+        if is_htmx:
+            return HttpResponseForbidden()
+        messages.error(request, 'No tienes acceso a este chat.')
+        return redirect('messaging:chat_list')
+
+    form = MessageForm(request.POST)
+    if not form.is_valid():
+        if is_htmx:
+            return HttpResponseBadRequest()
+        messages.error(request, 'El mensaje no es válido.')
+        return redirect('messaging:chat_detail', chat_id=chat.id)
+
+    message = form.save(commit=False)
+    message.chat = chat
+    message.sender = user
+    await message.asave()
+
+    if is_htmx:
+        return HttpResponse(status=204, headers={'HX-Trigger': 'messageSent'})
+    messages.success(request, 'Mensaje enviado.')
+    return redirect('messaging:chat_detail', chat_id=chat.id)
+
+
+@login_required
+@read_from_replica
+@cache_control(private=True, no_cache=True)
+@async_condition(chat_messages_etag)
+async def chat_messages(request, chat_id):
+    """Vista parcial para obtener mensajes (HTMX polling)
+
+    Con ``?after=<id>`` devuelve los mensajes posteriores a ese id (como
+    mucho ``MESSAGES_PAGE_SIZE``), o una respuesta 204 vacía si no hay nada
+    nuevo. El cursor por id no se
+    salta mensajes porque los de un chat se confirman en orden de id (ver
+    ``Message.save``). Es async: bajo ASGI cada poll no ocupa un hilo
+    mientras espera a la base de datos.
+    """
+    user = await request.auser()
+    chat = await aget_object_or_404(Chat, id=chat_id)
     
-    if not chat.user_can_access(request.user):
+    if not await chat.auser_can_access(user):
         return HttpResponseForbidden()
     
-    chat_messages = chat.messages.all().order_by('created_at')
-    return render(request, 'messaging/partials/message_list.html', {'chat_messages': chat_messages, 'user': request.user})
+    # Modo incremental: el cliente envía el id del último mensaje que ya tiene
+    after = request.GET.get('after')
+    if after is not None:
+        try:
+            after = int(after)
+        except ValueError:
+            return HttpResponseBadRequest()
+
+        # Como el stream SSE, por tandas: el siguiente poll trae el resto
+        new_messages = [
+            message async for message in
+            chat.messages.filter(id__gt=after).select_related('sender').order_by('id')[:MESSAGES_PAGE_SIZE]
+        ]
+        if not new_messages:
+            # Nada nuevo: HTMX no toca el DOM con un 204
+            return HttpResponse(status=204)
+        await ChatReadState.amark_read(user, chat.id, new_messages[-1].id)
+        return HttpResponse(await arender_messages(new_messages, user))
+
+    chat_messages, has_older = await chat.ahistory_page(limit=MESSAGES_PAGE_SIZE)
+    if chat_messages:
+        await ChatReadState.amark_read(user, chat.id, chat_messages[-1].id)
+    context = {
+        'chat': chat,
+        'chat_messages': chat_messages,
+        'has_older': has_older,
+        'user': user,
+    }
+    return await sync_to_async(render)(request, 'messaging/partials/message_list.html', context)
+
+
+@login_required
+def chat_messages_older(request, chat_id):
+    """Vista parcial con la página de mensajes anterior a ``?before=<id>``"""
+    chat = get_object_or_404(Chat, id=chat_id)
+
+    if not chat.user_can_access(request.user):
+        return HttpResponseForbidden()
+
+    try:
+        before = int(request.GET['before'])
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest()
+
+    chat_messages, has_older = chat.history_page(before_id=before, limit=MESSAGES_PAGE_SIZE)
+    context = {
+        'chat': chat,
+        'chat_messages': chat_messages,
+        'has_older': has_older,
+        'user': request.user,
+    }
+    return render(request, 'messaging/partials/older_messages.html', context)
+
+
+@login_required
+def unread_counts(request):
+    """Contadores de mensajes sin leer del usuario, por chat y en total (JSON)"""
+    accessible = Chat.objects.accessible_by(request.user).values('pk')
+    counts = Chat.objects.filter(pk__in=accessible).unread_counts(request.user)
+    return JsonResponse({
+        'total': sum(counts.values()),
+        'chats': {str(chat_id): count for chat_id, count in counts.items()},
+    })
+
+
+async def chat_stream(request, chat_id):
+    """Stream Server-Sent Events con los mensajes nuevos del chat
+
+    Solo disponible bajo ASGI; con WSGI responde 204 para que el cliente
+    siga usando el polling. Al reconectar, el navegador envía
+    ``Last-Event-ID`` y el stream continúa desde ese mensaje.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+
+    chat = await Chat.objects.filter(id=chat_id).afirst()
+    if chat is None:
+        raise Http404
+    if not await chat.auser_can_access(user):
+        return HttpResponseForbidden()
+
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.GET.get('after') or chat.last_message_id or 0)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    response = StreamingHttpResponse(_chat_events(chat, user, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _chat_events(chat, user, last_id):
+    """Generador de eventos SSE: un evento por mensaje, con su id como event id
+
+    Igual que el polling, avanza con ``id > last_id``: los mensajes de un
+    chat se confirman en orden de id. El acceso se vuelve a comprobar en
+    cada despertar (aviso o heartbeat) y el stream termina si se revocó.
+    """
+    # Suscribirse antes de leer para no perder mensajes entre lectura y espera
+    subscription = get_broker().subscribe(chat.id)
+    try:
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        while True:
+            # Desde la caché de acceso, que se invalida con cada cambio de membresía
+            if not await chat.auser_can_access(user):
+                return
+            new_messages = [
+                message async for message in chat.messages.filter(id__gt=last_id)
+                .select_related('sender').order_by('id')[:MESSAGES_PAGE_SIZE]
+            ]
+            for message in new_messages:
+                html = await arender_messages([message], user)
+                data = ''.join(f'data: {line}\n' for line in html.splitlines())
+                yield f'id: {message.id}\n{data}\n'
+                last_id = message.id
+            if new_messages:
+                await ChatReadState.amark_read(user, chat.id, last_id)
+            if len(new_messages) == MESSAGES_PAGE_SIZE:
+                continue
+
+            if await subscription.wait(SSE_HEARTBEAT_SECONDS) is None:
+                # Comentario SSE: mantiene viva la conexión y detecta clientes caídos
+                yield ': heartbeat\n\n'
+    finally:
+        subscription.close()
 
 
 @login_required
@@ -108,6 +291,7 @@ def create_direct_chat(request, user_id):
     )
     chat.participants.add(request.user, other_user)
     
+    pin_to_primary(request)
     messages.success(request, f'Chat con {other_user.username} creado.')
     return redirect('messaging:chat_detail', chat_id=chat.id)
 
@@ -132,16 +316,14 @@ def create_company_chat(request, company_id):
     if existing_chat:
         return redirect('messaging:chat_detail', chat_id=existing_chat.id)
     
-    # Crear nuevo chat de empresa
+    # Crear nuevo chat de empresa; sus miembros se materializan en
+    # ChatMembership y se mantienen al día (messaging.membership)
     chat = Chat.objects.create(
         type='company',
         company=company
     )
-    # Agregar todos los miembros de la empresa al chat
-    # company.members son Profiles, necesitamos obtener los Users
-    users = User.objects.filter(profile__company=company)
-    chat.participants.set(users)
     
+    pin_to_primary(request)
     messages.success(request, f'Chat de {company.name} creado.')
     return redirect('messaging:chat_detail', chat_id=chat.id)
 
@@ -170,16 +352,13 @@ def create_cooperative_chat(request, cooperative_id):
     if existing_chat:
         return redirect('messaging:chat_detail', chat_id=existing_chat.id)
     
-    # Crear nuevo chat de cooperativa
+    # Crear nuevo chat de cooperativa; los miembros de sus empresas se
+    # materializan en ChatMembership y se mantienen al día
     chat = Chat.objects.create(
         type='cooperative',
         cooperative=cooperative
     )
-    # Agregar todos los miembros de las empresas de la cooperativa
-    users = User.objects.filter(
-        profile__company__in=cooperative.companies.all()
-    ).distinct()
-    chat.participants.set(users)
     
+    pin_to_primary(request)
     messages.success(request, f'Chat de {cooperative.name} creado.')
     return redirect('messaging:chat_detail', chat_id=chat.id)
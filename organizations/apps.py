@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OrganizationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'organizations'
+
+    def ready(self):
+        # Registrar los receivers que mantienen el índice de búsqueda y los contadores
+        from . import search, stats  # noqa: F401
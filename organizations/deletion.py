@@ -0,0 +1,90 @@
+"""
+Eliminación de empresas y cooperativas en dos etapas.
+
+1. ``soft_delete_organization`` (en la petición): marca ``deleted_at``,
+   desvincula miembros y cooperativas con UPDATE/DELETE directos y quita el
+   acceso a sus chats. Desde ese momento el registro no aparece en ningún
+   listado (``objects`` lo excluye).
+2. ``purge_organization`` (en segundo plano, ver coopconnect.tasks): borra
+   los mensajes de sus chats en lotes acotados con ``_raw_delete``, sin
+   cargarlos en memoria, y después los chats y el propio registro.
+
+``manage.py purge_deleted_organizations`` retoma las purgas pendientes.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from coopconnect.tasks import enqueue
+from .models import Company, Cooperative
+from .stats import increment, mark_sectors_dirty
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 2000
+
+
+def soft_delete_organization(organization):
+    """Ocultar la empresa o cooperativa y encargar el borrado en cascada"""
+    from messaging.membership import refresh_company_memberships, refresh_user_memberships
+
+    model = type(organization)
+    with transaction.atomic():
+        organization.deleted_at = timezone.now()
+        organization.save(update_fields=['deleted_at'])
+        if model is Company:
+            member_ids = list(organization.members.values_list('user_id', flat=True))
+            organization.members.update(company=None)
+            organization.cooperatives.through.objects.filter(company=organization).delete()
+            refresh_user_memberships(member_ids)
+        else:
+            company_ids = list(organization.companies.values_list('pk', flat=True))
+            organization.companies.through.objects.filter(cooperative=organization).delete()
+            refresh_company_memberships(company_ids)
+        increment('companies' if model is Company else 'cooperatives', -1)
+        mark_sectors_dirty({organization.sector})
+        enqueue(purge_organization, model, organization.pk)
+
+
+def purge_organization(model, pk, batch_size=PURGE_BATCH_SIZE, progress=None):
+    """Borrar definitivamente una organización eliminada y el historial de sus chats
+
+    ``progress(borrados, total)`` se llama tras cada lote de mensajes.
+    """
+    from messaging.models import Chat, Message
+
+    organization = model.all_objects.filter(pk=pk, deleted_at__isnull=False).first()
+    if organization is None:
+        return
+
+    chat_filter = {'company': pk} if model is Company else {'cooperative': pk}
+    chat_ids = list(Chat.objects.filter(**chat_filter).values_list('pk', flat=True))
+    messages = Message.objects.filter(chat_id__in=chat_ids)
+    total = messages.count()
+    deleted = 0
+    while True:
+        batch = list(messages.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        # Nada referencia a Message: se puede borrar sin el collector de Django
+        with transaction.atomic():
+            Message.objects.filter(pk__in=batch)._raw_delete(Message.objects.db)
+        deleted += len(batch)
+        if progress:
+            progress(deleted, total)
+        else:
+            logger.info('Purgando %s %s: %s/%s mensajes', model._meta.model_name, pk, deleted, total)
+
+    with transaction.atomic():
+        Chat.objects.filter(pk__in=chat_ids).delete()
+        organization.delete()
+    logger.info('%s %s purgada (%s mensajes)', model._meta.verbose_name, pk, deleted)
+
+
+def pending_purges():
+    """Organizaciones eliminadas cuya purga no terminó: [(modelo, pk)]"""
+    return [
+        (model, pk)
+        for model in (Company, Cooperative)
+        for pk in model.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at').values_list('pk', flat=True)
+    ]
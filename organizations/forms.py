@@ -2,7 +2,22 @@ from django import forms
 from .models import Company, Cooperative
 
 
-class CompanyForm(forms.ModelForm):
+class ActiveNameMixin:
+    """Nombre único entre los registros no eliminados
+
+    La restricción única depende de ``deleted_at``, que no está en el
+    formulario, por lo que Django no la valida por sí solo.
+    """
+
+    def clean_name(self):
+        name = self.cleaned_data['name']
+        model = self._meta.model
+        if model.objects.filter(name=name).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError(model._meta.constraints[0].violation_error_message)
+        return name
+
+
+class CompanyForm(ActiveNameMixin, forms.ModelForm):
     """Formulario para crear/editar empresas"""
     class Meta:
         model = Company
@@ -24,7 +39,7 @@ class JoinCompanyForm(forms.Form):
     )
 
 
-class CooperativeForm(forms.ModelForm):
+class CooperativeForm(ActiveNameMixin, forms.ModelForm):
     """Formulario para crear/editar cooperativas"""
     class Meta:
         model = Cooperative
@@ -0,0 +1,290 @@
+"""
+Importación masiva de empresas, cooperativas y usuarios.
+
+Lee un archivo CSV o JSONL fila a fila (sin cargarlo entero en memoria).
+Cada fila indica su ``type``:
+
+* ``company``: name, sector, description, access_code (opcional)
+* ``cooperative``: name, sector, description, companies (nombres de
+  empresas; lista en JSONL o separados por ``;`` en CSV)
+* ``user``: username, email, first_name, last_name, password (opcional)
+  y company (nombre de la empresa, opcional)
+
+Las filas se procesan por lotes, cada uno en su propia transacción, con
+``bulk_create``: no se disparan las señales por fila y los perfiles se
+crean en bloque. Los contadores del sitio, el índice de búsqueda y las
+membresías de chat se actualizan dentro de la transacción de cada lote.
+Cada contraseña distinta se hashea una sola vez por importación.
+"""
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from accounts.models import Profile
+from organizations.models import SECTOR_CHOICES, Company, Cooperative
+from organizations.search import update_search_vectors
+from organizations.stats import increment, mark_sectors_dirty
+
+SECTOR_CODES = {code for code, _ in SECTOR_CHOICES}
+ROW_TYPES = ('company', 'cooperative', 'user')
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as error:
+            yield line_number, {'_error': f'JSON inválido: {error.msg}'}
+            continue
+        if not isinstance(row, dict):
+            yield line_number, {'_error': 'se esperaba un objeto JSON'}
+            continue
+        yield line_number, row
+
+
+def clean(value):
+    return str(value).strip() if value is not None else ''
+
+
+def member_names(row):
+    """Nombres de las empresas de una cooperativa (lista o texto separado por ';')"""
+    companies = row.get('companies') or ()
+    if isinstance(companies, str):
+        companies = companies.split(';')
+    return [name for name in map(clean, companies) if name]
+
+
+class Command(BaseCommand):
+    help = 'Importa empresas, cooperativas y usuarios desde un archivo CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo a importar ("-" para leer de la entrada estándar)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Formato del archivo (por defecto se deduce de la extensión)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Cantidad de filas procesadas por transacción')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size debe ser mayor que cero')
+
+        self.totals = {'company': 0, 'cooperative': 0, 'user': 0, 'skipped': 0, 'errors': 0}
+        # El hash es lo más lento de la importación: uno por contraseña distinta
+        self.password_hashes = {}
+
+        stream = sys.stdin if path == '-' else self._open(path)
+        try:
+            rows = read_csv(stream) if file_format == 'csv' else read_jsonl(stream)
+            started = time.monotonic()
+            processed = 0
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.import_batch(batch)
+                processed += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{processed} filas procesadas ({processed / elapsed:.0f} filas/s): '
+                    f'{self.totals["company"]} empresas, {self.totals["cooperative"]} cooperativas, '
+                    f'{self.totals["user"]} usuarios'
+                )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Importación terminada: {self.totals["company"]} empresas, '
+            f'{self.totals["cooperative"]} cooperativas y {self.totals["user"]} usuarios creados; '
+            f'{self.totals["skipped"]} filas ya existentes y {self.totals["errors"]} con errores.'
+        ))
+
+    def _open(self, path):
+        try:
+            return open(path, encoding='utf-8-sig', newline='')
+        except OSError as error:
+            raise CommandError(f'No se pudo abrir {path}: {error.strerror}')
+
+    def error(self, line_number, message):
+        self.totals['errors'] += 1
+        self.stderr.write(f'Línea {line_number}: {message}')
+
+    def import_batch(self, batch):
+        # Empresas cuyos miembros pueden haber ganado acceso a chats, y usuarios nuevos con empresa
+        self.touched_company_ids = set()
+        self.new_user_ids = []
+        grouped = {row_type: [] for row_type in ROW_TYPES}
+        for line_number, row in batch:
+            if '_error' in row:
+                self.error(line_number, row['_error'])
+                continue
+            row_type = clean(row.get('type')).lower()
+            if row_type not in grouped:
+                self.error(line_number, f'tipo desconocido "{row_type}"')
+                continue
+            grouped[row_type].append((line_number, row))
+
+        # Primero las empresas: cooperativas y usuarios del mismo lote pueden referenciarlas
+        self.import_companies(grouped['company'])
+        self.import_cooperatives(grouped['cooperative'])
+        self.import_users(grouped['user'])
+        self.refresh_memberships()
+
+    def _new_organizations(self, model, rows):
+        """Validar filas de empresa o cooperativa y descartar nombres ya existentes"""
+        valid = {}
+        for line_number, row in rows:
+            name, sector = clean(row.get('name')), clean(row.get('sector'))
+            if not name:
+                self.error(line_number, 'falta el nombre')
+            elif sector not in SECTOR_CODES:
+                self.error(line_number, f'sector inválido "{sector}"')
+            elif name in valid:
+                self.error(line_number, f'"{name}" está repetido en el archivo')
+            else:
+                valid[name] = (line_number, row)
+        existing = set(model.objects.filter(name__in=valid).values_list('name', flat=True))
+        self.totals['skipped'] += len(existing)
+        return valid, existing
+
+    def import_companies(self, rows):
+        valid, existing = self._new_organizations(Company, rows)
+        companies = [
+            Company(
+                name=name,
+                sector=clean(row.get('sector')),
+                description=clean(row.get('description')),
+                access_code=clean(row.get('access_code')) or Company._meta.get_field('access_code').default,
+            )
+            for name, (_, row) in valid.items()
+            if name not in existing
+        ]
+        Company.objects.bulk_create(companies)
+        update_search_vectors(Company, [company.pk for company in companies])
+        increment('companies', len(companies))
+        mark_sectors_dirty({company.sector for company in companies})
+        self.totals['company'] += len(companies)
+
+    def import_cooperatives(self, rows):
+        valid, existing = self._new_organizations(Cooperative, rows)
+        cooperatives = [
+            Cooperative(
+                name=name,
+                sector=clean(row.get('sector')),
+                description=clean(row.get('description')),
+            )
+            for name, (_, row) in valid.items()
+            if name not in existing
+        ]
+        Cooperative.objects.bulk_create(cooperatives)
+        update_search_vectors(Cooperative, [cooperative.pk for cooperative in cooperatives])
+        increment('cooperatives', len(cooperatives))
+        mark_sectors_dirty({cooperative.sector for cooperative in cooperatives})
+        self.totals['cooperative'] += len(cooperatives)
+
+        # Membresías, también para cooperativas que ya existían
+        cooperative_by_name = {
+            name: (pk, sector)
+            for pk, name, sector in Cooperative.objects.filter(name__in=valid).values_list('pk', 'name', 'sector')
+        }
+        company_names = {name for _, row in valid.values() for name in member_names(row)}
+        company_by_name = {
+            name: (pk, sector)
+            for pk, name, sector in Company.objects.filter(name__in=company_names).values_list('pk', 'name', 'sector')
+        }
+        through = []
+        for name, (line_number, row) in valid.items():
+            cooperative_id, sector = cooperative_by_name[name]
+            for company_name in member_names(row):
+                company = company_by_name.get(company_name)
+                if company is None:
+                    self.error(line_number, f'la empresa "{company_name}" no existe')
+                elif company[1] != sector:
+                    # Misma regla que Cooperative.can_join
+                    self.error(line_number, f'la empresa "{company_name}" es de otro sector')
+                else:
+                    through.append(Cooperative.companies.through(cooperative_id=cooperative_id, company_id=company[0]))
+                    self.touched_company_ids.add(company[0])
+        Cooperative.companies.through.objects.bulk_create(through, ignore_conflicts=True)
+
+    def import_users(self, rows):
+        valid = {}
+        for line_number, row in rows:
+            username = clean(row.get('username'))
+            if not username:
+                self.error(line_number, 'falta el nombre de usuario')
+            elif username in valid:
+                self.error(line_number, f'el usuario "{username}" está repetido en el archivo')
+            else:
+                valid[username] = (line_number, row)
+        existing = set(User.objects.filter(username__in=valid).values_list('username', flat=True))
+        self.totals['skipped'] += len(existing)
+
+        company_names = {clean(row.get('company')) for _, row in valid.values()} - {''}
+        companies = {
+            name: (pk, sector)
+            for pk, name, sector in Company.objects.filter(name__in=company_names).values_list('pk', 'name', 'sector')
+        }
+
+        users, profile_companies = [], []
+        for username, (line_number, row) in valid.items():
+            if username in existing:
+                continue
+            company_name = clean(row.get('company'))
+            if company_name and company_name not in companies:
+                self.error(line_number, f'la empresa "{company_name}" no existe')
+                continue
+            password = clean(row.get('password'))
+            users.append(User(
+                username=username,
+                email=clean(row.get('email')),
+                first_name=clean(row.get('first_name')),
+                last_name=clean(row.get('last_name')),
+                # Sin contraseña en el archivo, la cuenta queda sin contraseña utilizable
+                password=self.hash_password(password) if password else make_password(None),
+            ))
+            profile_companies.append(companies.get(company_name, (None, None)))
+
+        # bulk_create no dispara create_profile/save_profile: los perfiles se crean aquí
+        User.objects.bulk_create(users)
+        Profile.objects.bulk_create([
+            Profile(user_id=user.pk, company_id=company_id)
+            for user, (company_id, _) in zip(users, profile_companies)
+        ])
+        self.new_user_ids.extend(user.pk for user, (company_id, _) in zip(users, profile_companies) if company_id)
+        mark_sectors_dirty({sector for _, sector in profile_companies})
+        self.totals['user'] += len(users)
+
+    def hash_password(self, password):
+        if password not in self.password_hashes:
+            self.password_hashes[password] = make_password(password)
+        return self.password_hashes[password]
+
+    def refresh_memberships(self):
+        """Dar acceso a los chats de las empresas y cooperativas afectadas por el lote
+
+        Corre en la transacción del lote: membresías y contadores de chats
+        se confirman junto con las filas que los originan.
+        """
+        from messaging.membership import refresh_company_memberships, refresh_user_memberships
+
+        refresh_company_memberships(self.touched_company_ids)
+        refresh_user_memberships(self.new_user_ids)
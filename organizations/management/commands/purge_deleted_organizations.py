@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from organizations.deletion import PURGE_BATCH_SIZE, pending_purges, purge_organization
+
+
+class Command(BaseCommand):
+    help = 'Borra definitivamente las empresas y cooperativas eliminadas cuya purga quedó pendiente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE,
+                            help='Cantidad de mensajes borrados por transacción')
+
+    def handle(self, *args, **options):
+        pending = pending_purges()
+        if not pending:
+            self.stdout.write('No hay purgas pendientes.')
+            return
+
+        for model, pk in pending:
+            label = f'{model._meta.verbose_name} {pk}'
+
+            def progress(deleted, total, label=label):
+                self.stdout.write(f'{label}: {deleted}/{total} mensajes borrados')
+
+            purge_organization(model, pk, batch_size=options['batch_size'], progress=progress)
+            self.stdout.write(f'{label} purgada.')
+
+        self.stdout.write(self.style.SUCCESS(f'{len(pending)} organizaciones purgadas.'))
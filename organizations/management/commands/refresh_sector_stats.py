@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from organizations.models import SECTOR_CHOICES
+from organizations.stats import refresh_sector_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las estadísticas por sector pendientes (o todas con --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sectors', nargs='*', help='Sectores a recalcular (por defecto, los pendientes)')
+        parser.add_argument('--all', action='store_true', help='Recalcular todos los sectores')
+
+    def handle(self, *args, **options):
+        valid = dict(SECTOR_CHOICES)
+        unknown = [sector for sector in options['sectors'] if sector not in valid]
+        if unknown:
+            raise CommandError(f'Sectores desconocidos: {", ".join(unknown)}')
+
+        if options['all']:
+            sectors = list(valid)
+        else:
+            sectors = options['sectors'] or None
+
+        started = time.monotonic()
+        refreshed = refresh_sector_stats(sectors)
+        if not refreshed:
+            self.stdout.write('No hay sectores pendientes.')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(refreshed)} sectores recalculados en {time.monotonic() - started:.2f}s: '
+            f'{", ".join(valid[sector] for sector in refreshed)}'
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0003_alter_company_created_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['-created_at'], name='company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['sector', '-created_at'], name='company_sector_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cooperative',
+            index=models.Index(fields=['-created_at'], name='cooperative_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cooperative',
+            index=models.Index(fields=['sector', '-created_at'], name='cooperative_sector_created_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:11
+
+import django.contrib.postgres.search
+import organizations.models
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SECTOR_LABELS = {
+    'tecnologia': 'Tecnología', 'agricultura': 'Agricultura', 'manufactura': 'Manufactura',
+    'servicios': 'Servicios', 'comercio': 'Comercio', 'construccion': 'Construcción',
+    'educacion': 'Educación', 'salud': 'Salud', 'transporte': 'Transporte', 'turismo': 'Turismo',
+}
+
+
+def fill_search_vectors(apps, schema_editor):
+    """Calcular search_vector de las filas existentes; solo en PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.search import SearchVector
+    from django.db.models import Value
+
+    for model_name in ('company', 'cooperative'):
+        model = apps.get_model('organizations', model_name)
+        for sector, label in SECTOR_LABELS.items():
+            model.objects.filter(sector=sector).update(search_vector=(
+                SearchVector('name', weight='A', config='spanish') +
+                SearchVector(Value(label), weight='B', config='spanish') +
+                SearchVector('description', weight='C', config='spanish')
+            ))
+
+
+class PostgresTrigramExtension(TrigramExtension):
+    """pg_trgm; al revertir tampoco hace nada fuera de PostgreSQL"""
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0004_company_cooperative_indexes'),
+    ]
+
+    operations = [
+        PostgresTrigramExtension(),
+        migrations.AddField(
+            model_name='company',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cooperative',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=organizations.models.SearchGinIndex(fields=['search_vector'], name='company_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=organizations.models.SearchGinIndex(
+                fields=['name'], name='company_name_trgm', opclasses=['gin_trgm_ops'],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='cooperative',
+            index=organizations.models.SearchGinIndex(fields=['search_vector'], name='cooperative_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='cooperative',
+            index=organizations.models.SearchGinIndex(
+                fields=['name'], name='cooperative_name_trgm', opclasses=['gin_trgm_ops'],
+            ),
+        ),
+        # Al revertir, la columna desaparece con RemoveField
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+def initialize_counters(apps, schema_editor):
+    SiteCounter = apps.get_model('organizations', 'SiteCounter')
+    SiteCounter.objects.bulk_create([
+        SiteCounter(name='companies', value=apps.get_model('organizations', 'Company').objects.count()),
+        SiteCounter(name='cooperatives', value=apps.get_model('organizations', 'Cooperative').objects.count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0005_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador del sitio',
+                'verbose_name_plural': 'Contadores del sitio',
+            },
+        ),
+        migrations.RunPython(initialize_counters, migrations.RunPython.noop),
+    ]
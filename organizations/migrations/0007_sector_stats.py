@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+def create_sector_rows(apps, schema_editor):
+    """Una fila pendiente por sector; `refresh_sector_stats` las completa"""
+    SectorStats = apps.get_model('organizations', 'SectorStats')
+    sectors = [sector for sector, _ in SectorStats._meta.get_field('sector').choices]
+    SectorStats.objects.bulk_create([SectorStats(sector=sector, dirty=True) for sector in sectors])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0006_site_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectorStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sector', models.CharField(choices=[('tecnologia', 'Tecnología'), ('agricultura', 'Agricultura'), ('manufactura', 'Manufactura'), ('servicios', 'Servicios'), ('comercio', 'Comercio'), ('construccion', 'Construcción'), ('educacion', 'Educación'), ('salud', 'Salud'), ('transporte', 'Transporte'), ('turismo', 'Turismo')], max_length=50, unique=True)),
+                ('companies', models.PositiveIntegerField(default=0)),
+                ('cooperatives', models.PositiveIntegerField(default=0)),
+                ('members', models.PositiveIntegerField(default=0)),
+                ('messages', models.PositiveBigIntegerField(default=0)),
+                ('dirty', models.BooleanField(default=True)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Estadísticas de sector',
+                'verbose_name_plural': 'Estadísticas de sectores',
+                'ordering': ['sector'],
+            },
+        ),
+        migrations.RunPython(create_sector_rows, migrations.RunPython.noop),
+    ]
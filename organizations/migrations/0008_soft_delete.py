@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0007_sector_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cooperative',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='name',
+            field=models.CharField(max_length=200, verbose_name='Nombre'),
+        ),
+        migrations.AlterField(
+            model_name='cooperative',
+            name='name',
+            field=models.CharField(max_length=200, verbose_name='Nombre'),
+        ),
+        migrations.AddConstraint(
+            model_name='company',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('name',), name='company_active_name_unique', violation_error_message='Ya existe una empresa con este nombre.'),
+        ),
+        migrations.AddConstraint(
+            model_name='cooperative',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('name',), name='cooperative_active_name_unique', violation_error_message='Ya existe una cooperativa con este nombre.'),
+        ),
+    ]
@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 
 
@@ -17,14 +20,42 @@ SECTOR_CHOICES = [
 ]
 
 
+class ActiveManager(models.Manager):
+    """Excluye los registros eliminados que esperan el borrado en segundo plano"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class SearchGinIndex(GinIndex):
+    """Índice GIN de la búsqueda (organizations.search)
+
+    Solo PostgreSQL tiene GIN y pg_trgm: con otros motores (SQLite en
+    desarrollo y pruebas) se crea un índice normal sobre las mismas
+    columnas, sin clases de operadores.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        return models.Index(fields=self.fields, name=self.name).create_sql(model, schema_editor, **kwargs)
+
+
 class Company(models.Model):
     """Modelo de Empresa/PYME"""
-    name = models.CharField(max_length=200, unique=True, verbose_name='Nombre')
+    name = models.CharField(max_length=200, verbose_name='Nombre')
     sector = models.CharField(max_length=50, choices=SECTOR_CHOICES, verbose_name='Sector')
     description = models.TextField(verbose_name='Descripción')
     access_code = models.CharField(max_length=20, default='123456', verbose_name='Código de Acceso', help_text='Código para que otros usuarios se unan a tu empresa')
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='companies_created')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Mantenido por organizations.search (solo se usa en PostgreSQL)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Eliminación lógica: el borrado en cascada se hace en segundo plano (organizations.deletion)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.name
@@ -33,20 +64,50 @@ class Company(models.Model):
         verbose_name = 'Empresa'
         verbose_name_plural = 'Empresas'
         ordering = ['-created_at']
+        indexes = [
+            # Listados (filtrados o no por sector) ordenados por fecha
+            models.Index(fields=['-created_at'], name='company_created_idx'),
+            models.Index(fields=['sector', '-created_at'], name='company_sector_created_idx'),
+            # Búsqueda de texto y por similitud del nombre (organizations.search)
+            SearchGinIndex(fields=['search_vector'], name='company_search_vector_gin'),
+            SearchGinIndex(fields=['name'], name='company_name_trgm', opclasses=['gin_trgm_ops']),
+        ]
+        constraints = [
+            # El nombre de una empresa eliminada queda libre de inmediato
+            models.UniqueConstraint(
+                fields=['name'], condition=Q(deleted_at__isnull=True), name='company_active_name_unique',
+                violation_error_message='Ya existe una empresa con este nombre.',
+            ),
+        ]
+
+    def soft_delete(self):
+        """Ocultar la empresa de inmediato y encargar el borrado en cascada"""
+        from .deletion import soft_delete_organization
+        soft_delete_organization(self)
 
     @property
     def members_count(self):
+        # Usar la anotación `num_members` si la consulta la incluye (evita N+1)
+        if hasattr(self, 'num_members'):
+            return self.num_members
         return self.members.count()
 
 
 class Cooperative(models.Model):
     """Modelo de Cooperativa (agrupa empresas del mismo sector)"""
-    name = models.CharField(max_length=200, unique=True, verbose_name='Nombre')
+    name = models.CharField(max_length=200, verbose_name='Nombre')
     sector = models.CharField(max_length=50, choices=SECTOR_CHOICES, verbose_name='Sector')
     description = models.TextField(verbose_name='Descripción')
     companies = models.ManyToManyField(Company, related_name='cooperatives', blank=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='cooperatives_created')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Mantenido por organizations.search (solo se usa en PostgreSQL)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Eliminación lógica: el borrado en cascada se hace en segundo plano (organizations.deletion)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.name
@@ -55,12 +116,74 @@ class Cooperative(models.Model):
         verbose_name = 'Cooperativa'
         verbose_name_plural = 'Cooperativas'
         ordering = ['-created_at']
+        indexes = [
+            # Listados (filtrados o no por sector) ordenados por fecha
+            models.Index(fields=['-created_at'], name='cooperative_created_idx'),
+            models.Index(fields=['sector', '-created_at'], name='cooperative_sector_created_idx'),
+            # Búsqueda de texto y por similitud del nombre (organizations.search)
+            SearchGinIndex(fields=['search_vector'], name='cooperative_search_vector_gin'),
+            SearchGinIndex(fields=['name'], name='cooperative_name_trgm', opclasses=['gin_trgm_ops']),
+        ]
+        constraints = [
+            # El nombre de una cooperativa eliminada queda libre de inmediato
+            models.UniqueConstraint(
+                fields=['name'], condition=Q(deleted_at__isnull=True), name='cooperative_active_name_unique',
+                violation_error_message='Ya existe una cooperativa con este nombre.',
+            ),
+        ]
+
+    def soft_delete(self):
+        """Ocultar la cooperativa de inmediato y encargar el borrado en cascada"""
+        from .deletion import soft_delete_organization
+        soft_delete_organization(self)
 
     @property
     def companies_count(self):
+        # Usar la anotación `num_companies` si la consulta la incluye (evita N+1)
+        if hasattr(self, 'num_companies'):
+            return self.num_companies
         return self.companies.count()
 
     def can_join(self, company):
         """Verificar si una empresa puede unirse (mismo sector)"""
         return company.sector == self.sector
 
+
+
+class SiteCounter(models.Model):
+    """Contador global del sitio (evita COUNT(*) sobre tablas grandes)
+
+    Mantenido por organizations.stats al crear y eliminar registros.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    class Meta:
+        verbose_name = 'Contador del sitio'
+        verbose_name_plural = 'Contadores del sitio'
+
+
+class SectorStats(models.Model):
+    """Totales precalculados de un sector (ver organizations.stats)
+
+    ``dirty`` marca los sectores afectados por escrituras desde la última
+    actualización; ``refresh_sector_stats`` solo recalcula esos.
+    """
+    sector = models.CharField(max_length=50, choices=SECTOR_CHOICES, unique=True)
+    companies = models.PositiveIntegerField(default=0)
+    cooperatives = models.PositiveIntegerField(default=0)
+    members = models.PositiveIntegerField(default=0)
+    messages = models.PositiveBigIntegerField(default=0)
+    dirty = models.BooleanField(default=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.get_sector_display()
+
+    class Meta:
+        verbose_name = 'Estadísticas de sector'
+        verbose_name_plural = 'Estadísticas de sectores'
+        ordering = ['sector']
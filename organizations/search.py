@@ -0,0 +1,200 @@
+"""
+Búsqueda de texto sobre empresas y cooperativas.
+
+En PostgreSQL cada fila guarda un ``search_vector`` (nombre, sector y
+descripción con pesos A/B/C) indexado con GIN, y el nombre tiene un índice
+trigram para tolerar errores de tipeo. Con otros motores (SQLite en
+desarrollo y pruebas) se usa un índice invertido en memoria con la misma
+interfaz. En ambos casos el índice se actualiza al guardar o eliminar.
+"""
+import difflib
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Q, Value
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import SECTOR_CHOICES, Company, Cooperative
+
+SEARCH_CONFIG = 'spanish'
+SEARCH_MODELS = {'company': Company, 'cooperative': Cooperative}
+SECTOR_LABELS = dict(SECTOR_CHOICES)
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector(sector_label):
+    """Expresión SearchVector: nombre (A), sector (B) y descripción (C)"""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG) +
+        SearchVector(Value(sector_label), weight='B', config=SEARCH_CONFIG) +
+        SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(model, pks=None):
+    """Recalcular los vectores de búsqueda (tras cargas masivas sin señales)"""
+    if not uses_postgres():
+        _memory_index.reset()
+        return
+    queryset = model.objects.all() if pks is None else model.objects.filter(pk__in=pks)
+    for sector, label in SECTOR_CHOICES:
+        queryset.filter(sector=sector).update(search_vector=search_vector(label))
+
+
+def search_organizations(query, limit=20):
+    """Empresas y cooperativas que coinciden con ``query``, de mayor a menor relevancia
+
+    Devuelve una lista de tuplas ``(tipo, objeto, puntaje)``.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    if uses_postgres():
+        return _search_postgres(query, limit)
+    return _memory_index.search(query, limit)
+
+
+def _search_postgres(query, limit):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    results = []
+    for kind, model in SEARCH_MODELS.items():
+        rows = (
+            model.objects
+            # name % query usa el índice trigram con el umbral pg_trgm.similarity_threshold
+            # (0.3 por defecto); la similitud solo se calcula para ordenar
+            .filter(Q(search_vector=search_query) | Q(name__trigram_similar=query))
+            .annotate(score=SearchRank(F('search_vector'), search_query) + TrigramSimilarity('name', query))
+            .defer('search_vector')
+            .order_by('-score')[:limit]
+        )
+        results.extend((kind, obj, obj.score) for obj in rows)
+    results.sort(key=lambda result: result[2], reverse=True)
+    return results[:limit]
+
+
+# ===== ÍNDICE INVERTIDO EN MEMORIA (fallback sin PostgreSQL) =====
+
+FIELD_WEIGHTS = (('name', 1.0), ('sector', 0.4), ('description', 0.1))
+# Similitud mínima (0-1) para considerar un término como error de tipeo
+FUZZY_CUTOFF = 0.75
+
+
+def tokenize(text):
+    """Palabras en minúsculas y sin tildes"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r'\w+', text)
+
+
+class InvertedIndex:
+    """Índice invertido término -> {(tipo, pk): peso}, construido bajo demanda"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._documents = None
+
+    def reset(self):
+        with self._lock:
+            self._postings = None
+            self._documents = None
+
+    def _ensure_built(self):
+        if self._postings is not None:
+            return
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        for kind, model in SEARCH_MODELS.items():
+            for obj in model.objects.only('name', 'sector', 'description'):
+                self._add(kind, obj)
+
+    def _add(self, kind, obj):
+        doc_key = (kind, obj.pk)
+        terms = defaultdict(float)
+        fields = {'name': obj.name, 'sector': SECTOR_LABELS.get(obj.sector, obj.sector), 'description': obj.description}
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(fields[field]):
+                terms[token] += weight
+        for token, weight in terms.items():
+            self._postings[token][doc_key] = weight
+        self._documents[doc_key] = list(terms)
+
+    def _remove(self, kind, pk):
+        doc_key = (kind, pk)
+        for token in self._documents.pop(doc_key, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(doc_key, None)
+                if not postings:
+                    del self._postings[token]
+
+    def update(self, kind, obj):
+        with self._lock:
+            if self._postings is None:
+                return
+            self._remove(kind, obj.pk)
+            self._add(kind, obj)
+
+    def delete(self, kind, pk):
+        with self._lock:
+            if self._postings is not None:
+                self._remove(kind, pk)
+
+    def search(self, query, limit):
+        with self._lock:
+            self._ensure_built()
+            scores = defaultdict(float)
+            for token in tokenize(query):
+                if token in self._postings:
+                    candidates = [(token, 1.0)]
+                else:
+                    # Tolerancia a errores: términos parecidos, penalizados
+                    candidates = [
+                        (term, 0.5)
+                        for term in difflib.get_close_matches(token, self._postings.keys(), n=3, cutoff=FUZZY_CUTOFF)
+                    ]
+                for term, factor in candidates:
+                    for doc_key, weight in self._postings[term].items():
+                        scores[doc_key] += weight * factor
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+        by_kind = defaultdict(list)
+        for (kind, pk), _ in ranked:
+            by_kind[kind].append(pk)
+        objects = {
+            (kind, pk): obj
+            for kind, pks in by_kind.items()
+            for pk, obj in SEARCH_MODELS[kind].objects.in_bulk(pks).items()
+        }
+        return [(kind, objects[kind, pk], score) for (kind, pk), score in ranked if (kind, pk) in objects]
+
+
+_memory_index = InvertedIndex()
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Cooperative)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Mantener el índice de búsqueda al día en cada guardado"""
+    if update_fields is not None and not {'name', 'sector', 'description'} & set(update_fields):
+        return
+    kind = 'company' if sender is Company else 'cooperative'
+    if uses_postgres():
+        sector_label = SECTOR_LABELS.get(instance.sector, instance.sector)
+        sender.objects.filter(pk=instance.pk).update(search_vector=search_vector(sector_label))
+    else:
+        _memory_index.update(kind, instance)
+
+
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Cooperative)
+def remove_from_search_index(sender, instance, **kwargs):
+    if not uses_postgres():
+        _memory_index.delete('company' if sender is Company else 'cooperative', instance.pk)
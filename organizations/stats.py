@@ -0,0 +1,240 @@
+"""
+Estadísticas precalculadas: contadores globales y totales por sector.
+
+Los totales del dashboard se leen de SiteCounter en lugar de ejecutar
+COUNT(*). Cada alta o baja ajusta el contador con un UPDATE atómico dentro
+de la misma transacción, y al confirmarse se descarta la copia cacheada.
+
+SectorStats guarda empresas, cooperativas, miembros y mensajes por sector.
+Las escrituras solo marcan el sector como pendiente (``dirty``), y
+``refresh_sector_stats`` recalcula los sectores pendientes. Un sector
+también queda pendiente si sus chats recibieron mensajes después de la
+última actualización, sin tocar la ruta de envío de mensajes. Con
+``SECTOR_STATS_REFRESH_ON_WRITE`` el recálculo se hace al confirmar la
+escritura.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from accounts.models import profile_company_changed
+from coopconnect.cache import cached, invalidate
+from .models import SECTOR_CHOICES, Company, Cooperative, SectorStats, SiteCounter
+
+SITE_STATS_CACHE_KEY = 'site-stats'
+SITE_STATS_TIMEOUT = 60
+COUNTED_MODELS = {'companies': Company, 'cooperatives': Cooperative}
+SECTOR_STATS_CACHE_KEY = 'sector-stats'
+SECTOR_STATS_TIMEOUT = 5 * 60
+SECTOR_STATS_FIELDS = ('companies', 'cooperatives', 'members', 'messages')
+COMPANY_COOPERATIVES_TIMEOUT = 60
+
+
+def increment(name, delta=1):
+    """Sumar ``delta`` al contador ``name``"""
+    updated = SiteCounter.objects.filter(name=name).update(value=F('value') + delta)
+    if not updated:
+        # Contador aún no inicializado: partir del total real (ya incluye el cambio)
+        SiteCounter.objects.get_or_create(name=name, defaults={'value': COUNTED_MODELS[name].objects.count()})
+    transaction.on_commit(lambda: invalidate(SITE_STATS_CACHE_KEY))
+
+
+def site_stats():
+    """Totales del sitio {nombre: valor}, cacheados por unos segundos"""
+    def compute():
+        stats = dict.fromkeys(COUNTED_MODELS, 0)
+        stats.update(SiteCounter.objects.values_list('name', 'value'))
+        return stats
+
+    return cached(SITE_STATS_CACHE_KEY, compute, SITE_STATS_TIMEOUT)
+
+
+def _company_cooperatives_key(company_id):
+    return f'company-cooperatives:{company_id}'
+
+
+def company_cooperatives(company_id):
+    """Cooperativas de la empresa (dicts con ``id`` y ``name``), cacheadas por unos segundos"""
+    def compute():
+        return list(Cooperative.objects.filter(companies=company_id).order_by('pk').values('id', 'name'))
+
+    return cached(_company_cooperatives_key(company_id), compute, COMPANY_COOPERATIVES_TIMEOUT)
+
+
+def invalidate_company_cooperatives(company_ids):
+    keys = [_company_cooperatives_key(company_id) for company_id in company_ids]
+    if keys:
+        transaction.on_commit(lambda: invalidate(*keys))
+
+
+def mark_sectors_dirty(sectors):
+    """Marcar sectores como pendientes de recálculo (o recalcularlos al confirmar)"""
+    sectors = {sector for sector in sectors if sector}
+    if not sectors:
+        return
+    SectorStats.objects.filter(sector__in=sectors, dirty=False).update(dirty=True)
+    if settings.SECTOR_STATS_REFRESH_ON_WRITE:
+        transaction.on_commit(lambda: refresh_sector_stats(sectors))
+
+
+def stale_sectors():
+    """Sectores marcados o con mensajes nuevos en sus chats desde la última actualización"""
+    from messaging.models import Chat
+
+    new_messages = Chat.objects.filter(
+        Q(company__sector=OuterRef('sector')) | Q(cooperative__sector=OuterRef('sector')),
+        last_message_at__gt=OuterRef('refreshed_at'),
+    )
+    return list(
+        SectorStats.objects
+        .filter(Q(dirty=True) | Q(refreshed_at__isnull=True) | Exists(new_messages))
+        .values_list('sector', flat=True)
+    )
+
+
+def _grouped(queryset, field, aggregate, sectors):
+    rows = (
+        queryset.filter(**{f'{field}__in': sectors})
+        .order_by()
+        .values(field)
+        .annotate(total=aggregate)
+        .values_list(field, 'total')
+    )
+    return dict(rows)
+
+
+def refresh_sector_stats(sectors=None):
+    """Recalcular los sectores indicados (por defecto, los pendientes)
+
+    Devuelve la lista de sectores recalculados.
+    """
+    from accounts.models import Profile
+    from messaging.models import Chat
+
+    valid = dict(SECTOR_CHOICES)
+    sectors = [sector for sector in (stale_sectors() if sectors is None else sectors) if sector in valid]
+    if not sectors:
+        return []
+
+    # Desmarcar antes de leer: una escritura concurrente vuelve a marcar el sector
+    refreshed_at = timezone.now()
+    SectorStats.objects.filter(sector__in=sectors).update(dirty=False)
+
+    companies = _grouped(Company.objects, 'sector', Count('id'), sectors)
+    cooperatives = _grouped(Cooperative.objects, 'sector', Count('id'), sectors)
+    members = _grouped(Profile.objects, 'company__sector', Count('id'), sectors)
+    # Volumen de mensajes desde el contador de cada chat, sin agrupar Message
+    company_chats = Chat.objects.filter(type='company', company__deleted_at__isnull=True)
+    cooperative_chats = Chat.objects.filter(type='cooperative', cooperative__deleted_at__isnull=True)
+    company_messages = _grouped(company_chats, 'company__sector', Sum('message_count'), sectors)
+    cooperative_messages = _grouped(cooperative_chats, 'cooperative__sector', Sum('message_count'), sectors)
+
+    SectorStats.objects.bulk_create(
+        [
+            SectorStats(
+                sector=sector,
+                companies=companies.get(sector, 0),
+                cooperatives=cooperatives.get(sector, 0),
+                members=members.get(sector, 0),
+                messages=company_messages.get(sector, 0) + cooperative_messages.get(sector, 0),
+                dirty=False,
+                refreshed_at=refreshed_at,
+            )
+            for sector in sectors
+        ],
+        update_conflicts=True,
+        unique_fields=['sector'],
+        update_fields=[*SECTOR_STATS_FIELDS, 'refreshed_at'],
+    )
+    transaction.on_commit(lambda: invalidate(SECTOR_STATS_CACHE_KEY))
+    return sectors
+
+
+def sector_stats():
+    """Totales por sector (lista de dicts), cacheados por unos minutos"""
+    def compute():
+        return [
+            {
+                'sector': row.sector,
+                'label': row.get_sector_display(),
+                **{field: getattr(row, field) for field in SECTOR_STATS_FIELDS},
+                'refreshed_at': row.refreshed_at,
+            }
+            for row in SectorStats.objects.all()
+        ]
+
+    return cached(SECTOR_STATS_CACHE_KEY, compute, SECTOR_STATS_TIMEOUT)
+
+
+def _counter_name(sender):
+    return 'companies' if sender is Company else 'cooperatives'
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Cooperative)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        increment(_counter_name(sender))
+
+
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Cooperative)
+def count_deleted(sender, instance, **kwargs):
+    # Las eliminaciones lógicas ya se descontaron en soft_delete_organization
+    if instance.deleted_at is None:
+        increment(_counter_name(sender), -1)
+
+
+@receiver(post_init, sender=Company)
+@receiver(post_init, sender=Cooperative)
+def remember_sector(sender, instance, **kwargs):
+    # Sin acceder al atributo: si el campo está diferido no se dispara una consulta
+    instance._stats_sector = instance.__dict__.get('sector')
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Cooperative)
+def organization_saved(sender, instance, created, **kwargs):
+    if created or instance.sector != instance._stats_sector:
+        mark_sectors_dirty({instance._stats_sector, instance.sector})
+    instance._stats_sector = instance.sector
+
+
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Cooperative)
+def organization_deleted(sender, instance, **kwargs):
+    mark_sectors_dirty({instance.sector})
+
+
+@receiver(profile_company_changed)
+def profile_changed_company(sender, instance, old_company_id, **kwargs):
+    """Un usuario entró o salió de una empresa: cambian los miembros del sector"""
+    company_ids = {instance.company_id, old_company_id} - {None}
+    mark_sectors_dirty(Company.objects.filter(pk__in=company_ids).values_list('sector', flat=True))
+
+
+@receiver(post_delete, sender='accounts.Profile')
+def profile_deleted(sender, instance, **kwargs):
+    if instance.company_id:
+        mark_sectors_dirty(Company.objects.filter(pk=instance.company_id).values_list('sector', flat=True))
+
+
+@receiver(m2m_changed, sender=Cooperative.companies.through)
+def cooperative_companies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Una empresa entró o salió de una cooperativa: cambia su lista de cooperativas"""
+    if action == 'pre_clear':
+        # Tras el clear ya no se sabe qué empresas había; se invalida al confirmar igualmente
+        invalidate_company_cooperatives(
+            [instance.pk] if reverse else list(instance.companies.values_list('pk', flat=True))
+        )
+    elif action in ('post_add', 'post_remove'):
+        invalidate_company_cooperatives([instance.pk] if reverse else pk_set)
+
+
+@receiver(post_save, sender=Cooperative)
+def cooperative_saved(sender, instance, created, **kwargs):
+    # Renombrada o eliminada lógicamente: cambia la lista de sus empresas
+    if not created:
+        invalidate_company_cooperatives(instance.companies.values_list('pk', flat=True))
@@ -0,0 +1,320 @@
+import json
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from coopconnect.testing import Post, QueryBudgetSuite, htmx_elements
+from messaging.models import Chat, ChatMembership, Message, UserChatCount
+from .deletion import purge_organization
+from .models import Company, Cooperative, SiteCounter
+from .views import DIRECTORY_PAGE_SIZE
+from .search import search_organizations
+
+
+class QueryBudgetTests(QueryBudgetSuite, TestCase):
+    routes = ('organizations:',)
+
+    def budgets(self):
+        company, cooperative = self.data.company.pk, self.data.cooperative.pk
+        # Cooperativa del sector a la que la empresa del usuario aún no pertenece
+        open_cooperative = Cooperative.objects.create(
+            name=f'Abierta {self.data.rows}', sector='tecnologia', description='x',
+        ).pk
+        # Los POST que guardan una organización incluyen, en PostgreSQL, el UPDATE de search_vector
+        company_form = {'name': 'Nueva', 'sector': 'tecnologia', 'description': 'x', 'access_code': '1234'}
+        cooperative_form = {'name': 'Nueva', 'sector': 'tecnologia', 'description': 'x'}
+        return {
+            reverse('organizations:company_list'): 3,
+            reverse('organizations:cooperative_list'): 3,
+            reverse('organizations:company_detail', args=[company]): 8,
+            reverse('organizations:cooperative_detail', args=[cooperative]): 7,
+            f'{reverse("organizations:search")}?q=Empresa': 5,
+            reverse('organizations:sector_stats'): 3,
+            reverse('organizations:sector_stats_json'): 3,
+            reverse('organizations:company_create'): 2,
+            Post(reverse('organizations:company_create'), company_form): 20,
+            # El usuario ya tiene empresa: la vista redirige sin formulario
+            reverse('organizations:company_join', args=[company]): 5,
+            reverse('organizations:company_leave', args=[company]): 15,
+            reverse('organizations:company_edit', args=[company]): 4,
+            Post(reverse('organizations:company_edit', args=[company]), company_form): 7,
+            reverse('organizations:company_delete', args=[company]): 4,
+            Post(reverse('organizations:company_delete', args=[company])): 19,
+            reverse('organizations:cooperative_create'): 2,
+            Post(reverse('organizations:cooperative_create'), cooperative_form): 7,
+            reverse('organizations:cooperative_join', args=[open_cooperative]): 14,
+            reverse('organizations:cooperative_leave', args=[cooperative]): 17,
+            reverse('organizations:cooperative_edit', args=[cooperative]): 4,
+            Post(reverse('organizations:cooperative_edit', args=[cooperative]), cooperative_form): 8,
+            reverse('organizations:cooperative_delete', args=[cooperative]): 4,
+            Post(reverse('organizations:cooperative_delete', args=[cooperative])): 22,
+        }
+
+
+class DirectoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana')
+        self.client.force_login(self.user)
+        Company.objects.bulk_create(
+            Company(name=f'Empresa {i}', sector='salud' if i % 2 else 'turismo', description='x') for i in range(30)
+        )
+        # Misma fecha para todas: el id desempata el orden
+        Company.objects.update(created_at=timezone.now())
+
+    def page(self, **params):
+        response = self.client.get(reverse('organizations:company_list'), params)
+        return [company.name for company in response.context['companies']], response.context['has_more']
+
+    def test_keyset_pages_cover_directory_once(self):
+        names, has_more = self.page()
+        self.assertEqual(len(names), DIRECTORY_PAGE_SIZE)
+        self.assertTrue(has_more)
+        last = Company.objects.get(name=names[-1])
+        rest, has_more = self.page(before=last.pk)
+        self.assertFalse(has_more)
+        self.assertEqual(sorted(names + rest), sorted(Company.objects.values_list('name', flat=True)))
+
+    def test_sector_filter(self):
+        names, has_more = self.page(sector='salud')
+        self.assertEqual(len(names), 15)
+        self.assertFalse(has_more)
+        self.assertTrue(all(int(name.split()[1]) % 2 for name in names))
+
+    def test_member_and_company_counts(self):
+        company = Company.objects.get(name='Empresa 29')
+        self.user.profile.company = company
+        self.user.profile.save()
+        cooperative = Cooperative.objects.create(name='Coop', sector='salud', description='x')
+        cooperative.companies.add(company, Company.objects.get(name='Empresa 28'))
+        companies = self.client.get(reverse('organizations:company_list')).context['companies']
+        self.assertEqual({c.name: c.members_count for c in companies}['Empresa 29'], 1)
+        self.assertEqual({c.name: c.members_count for c in companies}['Empresa 28'], 0)
+        cooperatives = self.client.get(reverse('organizations:cooperative_list')).context['cooperatives']
+        self.assertEqual(cooperatives[0].companies_count, 2)
+
+    def test_load_more_renders_only_cards(self):
+        last = Company.objects.order_by('created_at', 'id').last()
+        response = self.client.get(reverse('organizations:company_list'), {'before': last.pk}, HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(response, 'organizations/partials/company_cards.html')
+        self.assertTemplateNotUsed(response, 'organizations/company_list.html')
+
+    def test_load_more_button_swaps_only_its_wrapper(self):
+        Cooperative.objects.bulk_create(
+            Cooperative(name=f'Cooperativa {i}', sector='salud', description='x') for i in range(30)
+        )
+        for route in ('organizations:company_list', 'organizations:cooperative_list'):
+            with self.subTest(route=route):
+                response = self.client.get(reverse(route), HTTP_HX_REQUEST='true')
+                [button] = htmx_elements(response.content.decode())
+                # hx-target="closest div" + outerHTML: el contenedor del botón, hermano
+                # de las tarjetas en la grilla; las tarjetas nuevas ocupan su lugar
+                depth, target = button.closest('div')
+                self.assertEqual(depth, 0)
+                self.assertEqual(target['class'], 'col-12 text-center')
+                self.assertEqual(button.attrs['hx-swap'], 'outerHTML')
+
+                last_page = self.client.get(button.attrs['hx-get'], HTTP_HX_REQUEST='true')
+                self.assertFalse(last_page.context['has_more'])
+                self.assertEqual(htmx_elements(last_page.content.decode()), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN de PostgreSQL')
+class DirectoryIndexTests(TestCase):
+    """La página siguiente recorre company_created_idx desde el cursor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ana')
+        Company.objects.bulk_create(
+            Company(name=f'Empresa {i}', sector='tecnologia', description='x') for i in range(5000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE organizations_company')
+
+    def test_next_page_uses_created_at_range(self):
+        self.client.force_login(self.user)
+        before = Company.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[100]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('organizations:company_list'), {'before': before})
+        sql = next(query['sql'] for query in queries if 'organizations_company' in query['sql'] and 'LIMIT' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('company_created_idx', plan, plan)
+        # Un rango sobre created_at, sin agrupar el directorio entero para contar miembros
+        self.assertRegex(plan, r'Index Cond: \(created_at <=')
+        self.assertNotIn('HashAggregate', plan)
+
+
+class ImportOrgsTests(TestCase):
+    def setUp(self):
+        # Chats ya existentes: los usuarios importados deben ganar acceso
+        self.company = Company.objects.create(name='Textil Andina', sector='manufactura', description='x')
+        self.company_chat = Chat.objects.create(type='company', company=self.company)
+        self.cooperative = Cooperative.objects.create(name='Red Textil', sector='manufactura', description='x')
+        self.cooperative_chat = Chat.objects.create(type='cooperative', cooperative=self.cooperative)
+
+    def import_rows(self, rows, batch_size=2):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            file.write('\n'.join(json.dumps(row) for row in rows))
+            file.flush()
+            stdout, stderr = StringIO(), StringIO()
+            call_command('import_orgs', file.name, batch_size=batch_size, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_imports_rows_and_grants_chat_access_per_batch(self):
+        counted = SiteCounter.objects.get(name='companies').value
+        _, stderr = self.import_rows([
+            {'type': 'company', 'name': 'Hilos del Sur', 'sector': 'manufactura', 'description': 'x'},
+            {'type': 'company', 'name': 'Sin sector', 'sector': 'nada'},
+            {'type': 'user', 'username': 'ana', 'company': 'Textil Andina', 'password': 'secreta'},
+            {'type': 'user', 'username': 'bea', 'company': 'Hilos del Sur'},
+            {'type': 'cooperative', 'name': 'Red Textil', 'sector': 'manufactura', 'companies': ['Hilos del Sur']},
+        ])
+        self.assertIn('Línea 2: sector inválido "nada"', stderr)
+        self.assertEqual(SiteCounter.objects.get(name='companies').value, counted + 1)
+
+        ana, bea = User.objects.get(username='ana'), User.objects.get(username='bea')
+        self.assertEqual(ana.profile.company, self.company)
+        self.assertTrue(ana.check_password('secreta'))
+        self.assertFalse(bea.has_usable_password())
+        self.assertTrue(self.cooperative.companies.filter(name='Hilos del Sur').exists())
+        # Bea entró antes que su empresa a la cooperativa: el lote de la cooperativa le da acceso
+        memberships = set(ChatMembership.objects.values_list('user__username', 'chat'))
+        self.assertLessEqual(
+            {('ana', self.company_chat.pk), ('bea', self.cooperative_chat.pk)}, memberships,
+        )
+        self.assertEqual(UserChatCount.objects.get(user=bea).value, 1)
+
+    def test_failed_batch_keeps_memberships_of_committed_ones(self):
+        rows = [
+            {'type': 'user', 'username': 'ana', 'company': 'Textil Andina'},
+            {'type': 'cooperative', 'name': 'Red Textil', 'sector': 'manufactura', 'companies': ['Textil Andina']},
+        ]
+        def fail_on_rows(rows):
+            if rows:
+                raise RuntimeError
+
+        with mock.patch(
+            'organizations.management.commands.import_orgs.Command.import_cooperatives', side_effect=fail_on_rows,
+        ):
+            with self.assertRaises(RuntimeError):
+                self.import_rows(rows, batch_size=1)
+        self.assertTrue(ChatMembership.objects.filter(user__username='ana', chat=self.company_chat).exists())
+
+    def test_hashes_each_distinct_password_once(self):
+        rows = [
+            {'type': 'user', 'username': f'socio{i}', 'password': 'bienvenida' if i < 4 else 'otra'}
+            for i in range(5)
+        ]
+        with mock.patch(
+            'organizations.management.commands.import_orgs.make_password', wraps=make_password,
+        ) as hasher:
+            self.import_rows(rows)
+        self.assertEqual(sorted(call.args[0] for call in hasher.call_args_list), ['bienvenida', 'otra'])
+        self.assertTrue(all(user.check_password('bienvenida') for user in User.objects.filter(username__lt='socio4')))
+
+
+@override_settings(BACKGROUND_TASKS='off')
+class OrganizationDeletionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana')
+        self.client.force_login(self.user)
+        self.company = Company.objects.create(name='Acme', sector='salud', description='x', created_by=self.user)
+        self.user.profile.company = self.company
+        self.user.profile.save()
+        self.chat = Chat.objects.create(type='company', company=self.company)
+        Message.objects.bulk_create(Message(chat=self.chat, sender=self.user, content=f'Hola {i}') for i in range(25))
+
+    def test_delete_hides_company_and_leaves_history_to_the_purge(self):
+        counted = SiteCounter.objects.get(name='companies').value
+        response = self.client.post(reverse('organizations:company_delete', args=[self.company.pk]))
+        self.assertRedirects(response, reverse('organizations:company_list'))
+        self.assertFalse(Company.objects.filter(pk=self.company.pk).exists())
+        self.assertIsNotNone(Company.all_objects.get(pk=self.company.pk).deleted_at)
+        self.user.profile.refresh_from_db()
+        self.assertIsNone(self.user.profile.company)
+        self.assertFalse(ChatMembership.objects.filter(chat=self.chat).exists())
+        self.assertEqual(SiteCounter.objects.get(name='companies').value, counted - 1)
+        # Los mensajes se borran en segundo plano, no en la petición
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 25)
+
+    def test_delete_cooperative_unlinks_companies(self):
+        cooperative = Cooperative.objects.create(name='Red', sector='salud', description='x', created_by=self.user)
+        cooperative.companies.add(self.company)
+        self.client.post(reverse('organizations:cooperative_delete', args=[cooperative.pk]))
+        self.assertFalse(self.company.cooperatives.exists())
+        self.assertFalse(Cooperative.objects.filter(pk=cooperative.pk).exists())
+
+    def test_purge_deletes_messages_in_bounded_batches(self):
+        self.company.soft_delete()
+        progress = []
+        with CaptureQueriesContext(connection) as queries:
+            purge_organization(Company, self.company.pk, batch_size=10, progress=lambda *args: progress.append(args))
+        self.assertEqual(progress, [(10, 25), (20, 25), (25, 25)])
+        # Un DELETE por lote, por clave primaria y sin pasar por el collector
+        batch_delete = 'DELETE FROM "messaging_message" WHERE "messaging_message"."id" IN'
+        batches = [query['sql'] for query in queries if query['sql'].startswith(batch_delete)]
+        self.assertEqual([batch.count(',') + 1 for batch in batches], [10, 10, 5])
+        self.assertFalse(Message.objects.filter(chat=self.chat).exists())
+        self.assertFalse(Chat.objects.filter(pk=self.chat.pk).exists())
+        self.assertFalse(Company.all_objects.filter(pk=self.company.pk).exists())
+
+    def test_purge_skips_organizations_that_were_not_deleted(self):
+        purge_organization(Company, self.company.pk)
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 25)
+
+    def test_command_resumes_pending_purges(self):
+        self.company.soft_delete()
+        stdout = StringIO()
+        call_command('purge_deleted_organizations', batch_size=20, stdout=stdout)
+        self.assertIn('20/25 mensajes borrados', stdout.getvalue())
+        self.assertFalse(Company.all_objects.filter(pk=self.company.pk).exists())
+        stdout = StringIO()
+        call_command('purge_deleted_organizations', stdout=stdout)
+        self.assertIn('No hay purgas pendientes.', stdout.getvalue())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        Company.objects.create(name='Textil Andina', sector='manufactura', description='Tejidos de alpaca')
+        Company.objects.create(name='Solar Norte', sector='tecnologia', description='Paneles')
+        Cooperative.objects.create(name='Cooperativa Cafetalera', sector='agricultura', description='Café de altura')
+
+    def test_tolerates_typos_in_name(self):
+        results = search_organizations('Textil Andna')
+        self.assertEqual([obj.name for _, obj, _ in results], ['Textil Andina'])
+
+    def test_matches_description(self):
+        results = search_organizations('alpaca')
+        self.assertEqual([(kind, obj.name) for kind, obj, _ in results], [('company', 'Textil Andina')])
+
+
+class SearchIndexTests(TestCase):
+    """Los índices de búsqueda vienen de Meta.indexes, no de SQL suelto"""
+
+    def test_indexes_exist_with_their_access_method(self):
+        expected_type = 'gin' if connection.vendor == 'postgresql' else 'idx'
+        for model in (Company, Cooperative):
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            prefix = model._meta.model_name
+            for name, columns in ((f'{prefix}_search_vector_gin', ['search_vector']), (f'{prefix}_name_trgm', ['name'])):
+                with self.subTest(index=name):
+                    self.assertIn(name, [index.name for index in model._meta.indexes])
+                    self.assertEqual(constraints[name]['columns'], columns)
+                    self.assertEqual(constraints[name]['type'], expected_type)
+
+    @skipUnless(connection.vendor == 'postgresql', 'pg_trgm de PostgreSQL')
+    def test_name_index_uses_trigram_opclass(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT indexdef FROM pg_indexes WHERE indexname = %s', ['company_name_trgm'])
+            self.assertIn('gin_trgm_ops', cursor.fetchone()[0])
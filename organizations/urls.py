@@ -21,4 +21,11 @@ urlpatterns = [
     path('cooperatives/<int:pk>/leave/', views.cooperative_leave, name='cooperative_leave'),
     path('cooperatives/<int:pk>/edit/', views.cooperative_edit, name='cooperative_edit'),
     path('cooperatives/<int:pk>/delete/', views.cooperative_delete, name='cooperative_delete'),
+
+    # Search
+    path('search/', views.search, name='search'),
+
+    # Estadísticas por sector
+    path('sectors/', views.sector_stats_page, name='sector_stats'),
+    path('sectors/json/', views.sector_stats_json, name='sector_stats_json'),
 ]
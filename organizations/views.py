@@ -1,17 +1,74 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Company, Cooperative
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_cookie
+from coopconnect.replica import pin_to_primary, read_from_replica
+from accounts.models import Profile
+from .models import SECTOR_CHOICES, Company, Cooperative
 from .forms import CompanyForm, CooperativeForm, JoinCompanyForm
+from .search import search_organizations
+from .stats import sector_stats
+
+# Tarjetas por página en los directorios de empresas y cooperativas
+DIRECTORY_PAGE_SIZE = 24
+
+
+def related_count(queryset, field):
+    """COUNT correlacionado de ``queryset`` agrupado por ``field`` (0 si no hay filas)
+
+    A diferencia de ``Count()`` no agrupa la consulta externa: el LIMIT de la
+    página puede cortar el recorrido del índice en lugar de agregar todo el
+    directorio antes de ordenar.
+    """
+    counts = queryset.order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def directory_page(request, queryset):
+    """Página de un directorio por keyset (created_at, id), filtrable por sector
+
+    Lee ``?sector=`` y ``?before=<id>`` (última tarjeta ya mostrada) y
+    devuelve ``(items, has_more, sector)`` con una sola consulta.
+    """
+    sector = request.GET.get('sector', '')
+    if sector in dict(SECTOR_CHOICES):
+        queryset = queryset.filter(sector=sector)
+    else:
+        sector = ''
+
+    before = request.GET.get('before', '')
+    if before.isdigit():
+        cursor = Subquery(queryset.model.objects.filter(pk=before).values('created_at')[:1])
+        # El rango sobre created_at deja que el índice recorra solo las filas
+        # anteriores; el OR solo desempata las de igual created_at
+        queryset = queryset.filter(created_at__lte=cursor).filter(Q(created_at__lt=cursor) | Q(id__lt=before))
+
+    page = list(queryset.order_by('-created_at', '-id')[:DIRECTORY_PAGE_SIZE + 1])
+    return page[:DIRECTORY_PAGE_SIZE], len(page) > DIRECTORY_PAGE_SIZE, sector
 
 
 # ===== COMPANY VIEWS =====
 
 @login_required
+@read_from_replica
 def company_list(request):
-    """Lista de todas las empresas"""
-    companies = Company.objects.all().order_by('-created_at')
-    return render(request, 'organizations/company_list.html', {'companies': companies})
+    """Lista de empresas, paginada y filtrable por sector"""
+    members = related_count(Profile.objects.filter(company=OuterRef('pk')), 'company')
+    companies, has_more, sector = directory_page(request, Company.objects.annotate(num_members=members))
+    context = {
+        'companies': companies,
+        'has_more': has_more,
+        'sector': sector,
+        'sector_choices': SECTOR_CHOICES,
+    }
+    # "Cargar más" (HTMX) solo necesita las tarjetas siguientes
+    if request.headers.get('HX-Request'):
+        return render(request, 'organizations/partials/company_cards.html', context)
+    return render(request, 'organizations/company_list.html', context)
 
 
 @login_required
@@ -40,8 +97,9 @@ def company_create(request):
 def company_detail(request, pk):
     """Detalle de una empresa"""
     company = get_object_or_404(Company, pk=pk)
-    members = company.members.all()
-    cooperatives = company.cooperatives.all()
+    members = list(company.members.select_related('user'))
+    cooperatives = list(company.cooperatives.all())
+    company.num_members = len(members)
     
     is_member = request.user.profile.company == company
     can_join = not request.user.profile.company
@@ -90,6 +148,7 @@ def company_leave(request, pk):
     if request.user.profile.company == company:
         request.user.profile.company = None
         request.user.profile.save()
+        pin_to_primary(request)
         messages.success(request, f'Has salido de {company.name}.')
     
     return redirect('organizations:company_list')
@@ -128,7 +187,8 @@ def company_delete(request, pk):
         return redirect('organizations:company_detail', pk=company.id)
     
     if request.method == 'POST':
-        company.delete()
+        # Se oculta al instante; el historial de chats se borra en segundo plano
+        company.soft_delete()
         messages.success(request, 'Empresa eliminada exitosamente.')
         return redirect('organizations:company_list')
     
@@ -138,10 +198,21 @@ def company_delete(request, pk):
 # ===== COOPERATIVE VIEWS =====
 
 @login_required
+@read_from_replica
 def cooperative_list(request):
-    """Lista de todas las cooperativas"""
-    cooperatives = Cooperative.objects.all().order_by('-created_at')
-    return render(request, 'organizations/cooperative_list.html', {'cooperatives': cooperatives})
+    """Lista de cooperativas, paginada y filtrable por sector"""
+    companies = related_count(Cooperative.companies.through.objects.filter(cooperative=OuterRef('pk')), 'cooperative')
+    cooperatives, has_more, sector = directory_page(request, Cooperative.objects.annotate(num_companies=companies))
+    context = {
+        'cooperatives': cooperatives,
+        'has_more': has_more,
+        'sector': sector,
+        'sector_choices': SECTOR_CHOICES,
+    }
+    # "Cargar más" (HTMX) solo necesita las tarjetas siguientes
+    if request.headers.get('HX-Request'):
+        return render(request, 'organizations/partials/cooperative_cards.html', context)
+    return render(request, 'organizations/cooperative_list.html', context)
 
 
 @login_required
@@ -165,7 +236,8 @@ def cooperative_create(request):
 def cooperative_detail(request, pk):
     """Detalle de una cooperativa"""
     cooperative = get_object_or_404(Cooperative, pk=pk)
-    companies = cooperative.companies.all()
+    companies = list(cooperative.companies.annotate(num_members=Count('members')))
+    cooperative.num_companies = len(companies)
     
     user_company = request.user.profile.company
     is_member = user_company and user_company in companies
@@ -192,6 +264,7 @@ def cooperative_join(request, pk):
         messages.error(request, 'Tu empresa no puede unirse a esta cooperativa (sectores diferentes).')
     else:
         cooperative.companies.add(user_company)
+        pin_to_primary(request)
         messages.success(request, f'¡Tu empresa se ha unido a {cooperative.name}!')
     
     return redirect('organizations:cooperative_detail', cooperative.id)
@@ -205,6 +278,7 @@ def cooperative_leave(request, pk):
     
     if user_company and user_company in cooperative.companies.all():
         cooperative.companies.remove(user_company)
+        pin_to_primary(request)
         messages.success(request, f'Tu empresa ha salido de {cooperative.name}.')
     
     return redirect('organizations:cooperative_list')
@@ -243,9 +317,42 @@ def cooperative_delete(request, pk):
         return redirect('organizations:cooperative_detail', pk=cooperative.id)
     
     if request.method == 'POST':
-        cooperative.delete()
+        cooperative.soft_delete()
         messages.success(request, 'Cooperativa eliminada exitosamente.')
         return redirect('organizations:cooperative_list')
     
     return render(request, 'organizations/cooperative_confirm_delete.html', {'cooperative': cooperative})
 
+
+# ===== SEARCH =====
+
+@login_required
+def search(request):
+    """Búsqueda de empresas y cooperativas por nombre, descripción y sector"""
+    query = request.GET.get('q', '').strip()
+    results = search_organizations(query) if query else []
+    context = {
+        'query': query,
+        'results': [{'kind': kind, 'object': obj} for kind, obj, score in results],
+    }
+    if request.headers.get('HX-Request'):
+        return render(request, 'organizations/partials/search_results.html', context)
+    return render(request, 'organizations/search.html', context)
+
+
+# ===== ESTADÍSTICAS POR SECTOR =====
+
+@login_required
+@cache_control(private=True, max_age=60)
+# La página lleva el token CSRF del logout: otra cookie (nuevo login) no reutiliza la copia
+@vary_on_cookie
+def sector_stats_page(request):
+    """Totales precalculados por sector (ver organizations.stats)"""
+    return render(request, 'organizations/sector_stats.html', {'stats': sector_stats()})
+
+
+@login_required
+@cache_control(private=True, max_age=60)
+def sector_stats_json(request):
+    """Los mismos totales en JSON"""
+    return JsonResponse({'sectors': sector_stats()})